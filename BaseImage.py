@@ -1,2 +1,168 @@
-import torch
-from torchvision.ops import box_iou
\ No newline at end of file
+import numpy as np
+from iou import bboxes2pts, batch_evaluate, get_hits
+from profiler import profiled
+
+torch = None
+box_iou = None
+
+BOX_DTYPE = np.float32
+
+
+def load_torch(threads: int | None = None):
+    """import torch and torchvision box_iou on first use only, so torch stays an optional dependency"""
+    global torch, box_iou
+    if torch is None:
+        import torch
+        from torchvision.ops import box_iou
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def _offsets(lengths) -> np.ndarray:
+    return np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+
+
+def _frames_boxes(frames_bboxes: list, sizes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """all the frames [x, y, w, h] bboxes normalized by their frame size in one (N, 4) array, and their offsets"""
+    offsets = _offsets([len(bboxes) for bboxes in frames_bboxes])
+    boxes = np.concatenate([np.asarray(bboxes, dtype=np.float64).reshape(-1, 4) for bboxes in frames_bboxes] +
+                           [np.zeros((0, 4))])
+    boxes /= np.repeat(np.tile(sizes, 2), np.diff(offsets), axis=0)
+    return boxes.astype(BOX_DTYPE), offsets
+
+
+def _split(values: np.ndarray, offsets: np.ndarray) -> list[np.ndarray]:
+    """the rows of every frame, frame i owns values[offsets[i]:offsets[i + 1]]"""
+    return [values[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+class SceneBuffer:
+    """
+    contiguous float32 storage of all the frames of a scene, frame i owns the rows
+    gt_offsets[i]:gt_offsets[i + 1] of gt_boxes (same for the pred boxes / confidence and the flat metric).
+    """
+    __slots__ = ('gt_boxes', 'gt_offsets', 'pred_boxes', 'pred_offsets', 'confidences',
+                 'metrics', 'metric_offsets', 'counts', 'gt_best', 'pred_best', 'gt_confidence')
+
+    @profiled('buffer')
+    def __init__(self, annotations: list[dict]):
+        """
+        :param annotations: per frame dicts of width, height, gt_bboxes, pred_bboxes and optionally confidence,
+                            frames without confidence get a confidence of 1
+        """
+        sizes = np.array([[ann['width'], ann['height']] for ann in annotations], dtype=np.float64).reshape(-1, 2)
+        self.gt_boxes, self.gt_offsets = _frames_boxes([ann['gt_bboxes'] for ann in annotations], sizes)
+        self.pred_boxes, self.pred_offsets = _frames_boxes([ann['pred_bboxes'] for ann in annotations], sizes)
+        self.confidences = np.concatenate([np.asarray(ann.get('confidence', np.ones(len(ann['pred_bboxes']))))
+                                           for ann in annotations] + [np.zeros(0)]).astype(BOX_DTYPE)
+        self.metrics = np.zeros(0, dtype=BOX_DTYPE)
+        self.metric_offsets = np.zeros(len(annotations) + 1, dtype=np.int64)
+        self.counts = np.zeros((len(annotations), 3), dtype=np.int64)
+        self.gt_best = np.zeros(len(self.gt_boxes))
+        self.pred_best = np.zeros(len(self.pred_boxes))
+        self.gt_confidence = np.full(len(self.gt_boxes), -np.inf)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def gt_lens(self) -> np.ndarray:
+        return np.diff(self.gt_offsets)
+
+    @property
+    def pred_lens(self) -> np.ndarray:
+        return np.diff(self.pred_offsets)
+
+    @profiled('iou')
+    def evaluate(self, th: float) -> np.ndarray:
+        """
+        check the collisions of all the frames and return the (F, 3) tp, fp, fn at {th}.
+        the raw iou matrices and the best iou of every box are stored, they are the same for every threshold
+        """
+        # sliced from the offsets, np.split of an empty scene would make one empty frame
+        gt_pts, pred_pts = (_split(bboxes2pts(boxes), offsets) for boxes, offsets
+                            in ((self.gt_boxes, self.gt_offsets), (self.pred_boxes, self.pred_offsets)))
+        matrices, self.counts, self.gt_best, self.pred_best = batch_evaluate(gt_pts, pred_pts, th)
+        metrics = np.concatenate([m.ravel() for m in matrices] + [np.zeros(0)])
+        self.metric_offsets = _offsets(self.gt_lens * self.pred_lens)
+        self.gt_confidence = self.hit_confidence(metrics, th)
+        self.metrics = metrics.astype(BOX_DTYPE)
+        return self.counts
+
+    def hit_confidence(self, metrics: np.ndarray, th: float) -> np.ndarray:
+        """
+        the highest confidence of the preds hitting every gt box, -inf for a gt box without hit.
+        a gt box is a tp for the preds kept above a confidence cut-off c when its hit confidence is >= c
+        """
+        cells = np.diff(self.metric_offsets)
+        frame_ids = np.repeat(np.arange(len(cells)), cells)
+        positions = np.arange(len(metrics)) - np.repeat(self.metric_offsets[:-1], cells)
+        pred_lens = self.pred_lens[frame_ids]
+        hits = get_hits(metrics, th)
+        gt_ids = (self.gt_offsets[frame_ids] + positions // np.maximum(pred_lens, 1))[hits]
+        pred_ids = (self.pred_offsets[frame_ids] + positions % np.maximum(pred_lens, 1))[hits]
+        gt_confidence = np.full(len(self.gt_boxes), -np.inf)
+        np.maximum.at(gt_confidence, gt_ids, self.confidences[pred_ids].astype(np.float64))
+        return gt_confidence
+
+    def gt(self, i: int) -> np.ndarray:
+        return self.gt_boxes[self.gt_offsets[i]:self.gt_offsets[i + 1]]
+
+    def pred(self, i: int) -> np.ndarray:
+        return self.pred_boxes[self.pred_offsets[i]:self.pred_offsets[i + 1]]
+
+    def confidence(self, i: int) -> np.ndarray:
+        return self.confidences[self.pred_offsets[i]:self.pred_offsets[i + 1]]
+
+    def metric(self, i: int) -> np.ndarray:
+        shape = (self.gt_offsets[i + 1] - self.gt_offsets[i], self.pred_offsets[i + 1] - self.pred_offsets[i])
+        return self.metrics[self.metric_offsets[i]:self.metric_offsets[i + 1]].reshape(shape)
+
+
+class BaseImage:
+    """a frame, its boxes and metric are views into the SceneBuffer of its manager"""
+    __slots__ = ('manager', 'index', 'name', 'width', 'height')
+
+    def __init__(self, manager, index: int, data: dict):
+        self.manager = manager
+        self.index = index
+        self.name = data['thermal_name']
+        self.width = data['width']
+        self.height = data['height']
+
+    @property
+    def gt(self) -> np.ndarray:
+        return self.manager.buffer.gt(self.index)
+
+    @property
+    def pred(self) -> np.ndarray:
+        return self.manager.buffer.pred(self.index)
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.manager.buffer.confidence(self.index)
+
+    @property
+    def metric(self) -> np.ndarray:
+        """the iou matrix of the frame zeroed below the manager th"""
+        iou = self.manager.buffer.metric(self.index)
+        return np.where(iou >= self.manager.th, iou, 0)
+
+    @property
+    def tp(self) -> int:
+        return int(self.manager.buffer.counts[self.index, 0])
+
+    @property
+    def fp(self) -> int:
+        return int(self.manager.buffer.counts[self.index, 1])
+
+    @property
+    def fn(self) -> int:
+        return int(self.manager.buffer.counts[self.index, 2])
+
+    def get_info(self):
+        return len(self.gt), len(self.pred), self.tp, self.fp, self.fn
+
+    def __repr__(self):
+        return (f"\n{'-' * 100}\n{self.name}\nwidth: {self.width} height: "
+                f"{self.height}\n{self.pred}\n{self.gt}\n{self.metric}\n{'-' * 100}\n")
@@ -1,5 +1,15 @@
+import logging
+import os
+from cache import BoxCache, ResultStore
+from curves import CURVE_FIELDS_NAMES, POINTS_FIELDS_NAMES, Curve, merge_curves_inputs, pr_curve
+from helpers import write_csv
+from iou import get_backend, set_backend
+from profiler import profiled
+
 FIELDS_NAMES = ['group_name', 'GT', 'PREDICT', 'RECALL', 'F1_SCORE', 'FN', 'FP', 'TP']
 
+logger = logging.getLogger(__name__)
+
 
 class BaseLoader:
     def __init__(self, **options):
@@ -8,8 +18,19 @@ class BaseLoader:
         self.pred = options['pred']
         self.th = options['th']
         self.d_th = options['d_th'] if self.model == 'ogi' else None
+        self.threads = options.get('threads')
+        # the backend is process wide, a loader without one keeps the backend selected before
+        self.backend = set_backend(options['backend'], self.threads) if options.get('backend') else get_backend()
+        self.workers = options.get('workers')
+        self.cache = (BoxCache(options['cache'], verify=options.get('verify_cache', False)) if options.get('cache')
+                      else None)
+        self.results = ResultStore(options['incremental']) if options.get('incremental') else None
+        self.gt_memo: dict | None = options.get('gt_memo')  # parsed gt shared between loaders, see batch.py
         self._index = 0
-        self.children = []
+        self._children = []
+        self._contributions = []  # per child (gt_count, pred_count, tp, fp, fn)
+        self._dirty = set()
+        self._totals = [0] * 5
         self.children_count = None
         self.gt_count = 0
         self.pred_count = 0
@@ -17,8 +38,63 @@ class BaseLoader:
         self.fp = 0
         self.fn = 0
 
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
+        self._contributions = [(0,) * 5] * len(children)
+        self._totals = [0] * 5
+        self.mark_dirty()
+
+    def mark_dirty(self, index: int | None = None):
+        """the child {index} (all the children when None) changed, its contribution is recomputed on next read"""
+        self._dirty.update(range(len(self._children)) if index is None else [index])
+
+    def update_child(self, index: int, child):
+        self._children[index] = child
+        self.mark_dirty(index)
+
+    def set_threshold(self, th: float):
+        """re-evaluate the children at the iou threshold {th}, only the re-evaluated children are re-aggregated"""
+        self.th = th
+        for i, child in enumerate(self._children):
+            if child.th != th:
+                child.set_threshold(th)
+                self.mark_dirty(i)
+
+    def shared_gt(self, path, load):
+        """the parsed gt of {path} from the gt memo, {load} parses it when it is not there (or without memo)"""
+        if self.gt_memo is None:
+            return load()
+        key = (self.model, str(path))
+        if key not in self.gt_memo:
+            self.gt_memo[key] = load()
+        return self.gt_memo[key]
+
+    def child_totals(self, child) -> tuple[int, int, int, int, int]:
+        """the (gt_count, pred_count, tp, fp, fn) contribution of a child to the loader totals"""
+        _, gt_count, pred_count, tp, fp, fn, _ = child.get_info()
+        return gt_count, pred_count, tp, fp, fn
+
+    @profiled('aggregate')
+    def totals(self) -> tuple[int, int, int, int, int]:
+        """
+        the cached (gt_count, pred_count, tp, fp, fn) of all the children,
+        only the dirty children contributions are recomputed and swapped into the totals
+        """
+        for i in self._dirty:
+            old, new = self._contributions[i], self.child_totals(self._children[i])
+            self._totals = [total - before + after for total, before, after in zip(self._totals, old, new)]
+            self._contributions[i] = new
+        self._dirty.clear()
+        return tuple(self._totals)
+
     def collect_children_data(self):
-        pass
+        self.gt_count, self.pred_count, self.tp, self.fp, self.fn = self.totals()
+        return self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
 
     def export_data(self, path: str):
         # FIELDS_NAMES = ['group_name', 'GT', 'PREDICT', 'RECALL', 'F1_SCORE', 'FN', 'FP', 'TP']
@@ -32,6 +108,25 @@ class BaseLoader:
              }
             for child in self.children]
 
+    @profiled('curves')
+    def curves(self) -> list[tuple[str, Curve]]:
+        """the confidence precision/recall curve of every child and the overall curve of all of them"""
+        inputs = [child.curve_inputs() for child in self.children]
+        curves = [(child.name, pr_curve(*data)) for child, data in zip(self.children, inputs)]
+        return curves + [(self.model, pr_curve(*merge_curves_inputs(inputs)))]
+
+    def export_curves(self, path: str):
+        """write the ap / best f1 summary of the curves to {path} and their points to {path}_points.csv"""
+        curves = self.curves()
+        # an ogi frame without gt is a single curve entry, report the real pred boxes count
+        pred_counts = [child.pred_count for child in self.children]
+        summary = [{**curve.summary(name), 'PREDICT': count}
+                   for (name, curve), count in zip(curves, pred_counts + [sum(pred_counts)])]
+        for row in summary:
+            logger.info("%s", row)
+        write_csv(path, CURVE_FIELDS_NAMES, summary)
+        write_csv(f"{os.path.splitext(path)[0]}_points.csv", POINTS_FIELDS_NAMES,
+                  [point for name, curve in curves for point in curve.points(name)])
 
     @property
     def index(self):
@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from helpers import get_analysis, is_csv, read_csv, write_csv
+from BaseLoader import FIELDS_NAMES
+from iou import BACKENDS, DEFAULT_BACKEND
+from ogi import FIELDS_NAMES as OGI_FRAMES_FIELDS_NAMES, OgiLoader
+from profiler import profile_run
+from tnd import FIELDS_NAMES as TND_FRAMES_FIELDS_NAMES, TndLoader
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+JOB_FIELDS_NAMES = ['job', 'model', 'gt', 'pred', 'th', 'd_th']
+FRAMES_FIELDS_NAMES = {'ogi': OGI_FRAMES_FIELDS_NAMES, 'tnd': TND_FRAMES_FIELDS_NAMES}
+LOADERS = {'ogi': OgiLoader, 'tnd': TndLoader}
+
+logger = logging.getLogger(__name__)
+
+# parsed gt of the jobs run by this process, keyed by (model, gt path), see BaseLoader.shared_gt
+_gt_memo: dict = {}
+
+
+def load_manifest(path: str) -> list[dict]:
+    """
+    the jobs of a manifest, a csv with the columns model, gt, pred, th, d_th (ogi only) and an optional name,
+    or a json list of such objects (or {"defaults": {...}, "jobs": [...]}, every job extends the defaults).
+    a tnd job pred may be a list of paths in json, ';' separated in csv. relative paths are from the manifest dir
+    """
+    if is_csv(path):
+        jobs = [{key: value for key, value in row.items() if value not in (None, '')} for row in read_csv(path)]
+        for job in jobs:
+            if 'pred' in job and ';' in job['pred']:
+                job['pred'] = job['pred'].split(';')
+    else:
+        with open(path, mode='r') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict):
+            jobs = [{**manifest.get('defaults', {}), **job} for job in manifest['jobs']]
+        else:
+            jobs = manifest
+    root = os.path.dirname(os.path.abspath(path))
+    return [check_job(i, job, root) for i, job in enumerate(jobs)]
+
+
+def check_job(i: int, job: dict, root: str) -> dict:
+    missing = [key for key in ('model', 'gt', 'pred', 'th') if key not in job]
+    if job.get('model') == 'ogi' and 'd_th' not in job:
+        missing.append('d_th')
+    if missing:
+        raise ValueError(f"manifest job {i} misses {', '.join(missing)}")
+    if job['model'] not in LOADERS:
+        raise ValueError(f"manifest job {i} has an unknown model {job['model']!r}, expected one of {list(LOADERS)}")
+    preds = job['pred'] if isinstance(job['pred'], list) else [job['pred']]
+    preds = [os.path.normpath(os.path.join(root, pred)) for pred in preds]
+    # the default name has the job index, jobs with the same pred file name (in other dirs) stay apart
+    stems = '+'.join(os.path.splitext(os.path.basename(pred))[0] for pred in preds)
+    name = job.get('name') or f"{job['model']}:{i}:{stems}"
+    return {**job, 'index': i, 'name': name,
+            'gt': os.path.normpath(os.path.join(root, job['gt'])), 'pred': preds if job['model'] == 'tnd' else preds[0],
+            'th': float(job['th']), 'd_th': float(job['d_th']) if job['model'] == 'ogi' else None}
+
+
+def group_jobs(jobs: list[dict], workers: int) -> list[list[dict]]:
+    """
+    the jobs grouped by gt, each group runs in one process so its gt is parsed once.
+    big groups are split so all the {workers} get a part when there are fewer gt than workers
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job['model'], str(job['gt'])), []).append(job)
+    parts = max(workers // len(groups), 1) if groups else 1
+    chunks = []
+    for group in groups.values():
+        size = -(-len(group) // parts)
+        chunks += [group[i:i + size] for i in range(0, len(group), size)]
+    return chunks
+
+
+def run_job(job: dict, options: dict) -> dict:
+    """evaluate a job and return its report: the job, its per group (scene / pred file) and per frame rows"""
+    report = {'index': job['index'], 'job': job['name'],
+              **{field: job[field] for field in ('model', 'gt', 'pred', 'th', 'd_th')}}
+    try:
+        loader = LOADERS[job['model']](model=job['model'], gt=job['gt'], pred=job['pred'], th=job['th'],
+                                       d_th=job['d_th'], gt_memo=_gt_memo, **options)
+        loader.build()
+        gt_count, pred_count, tp, fp, fn, _ = loader.collect_children_data()
+        # the overall row of the job is named after its model, like the overall curve
+        groups = loader.export_data('') + [{'group_name': job['model'], 'GT': gt_count, 'PREDICT': pred_count,
+                                            'TP': tp, 'FP': fp, 'FN': fn}]
+        for row in groups:
+            row['RECALL'], _, row['F1_SCORE'] = get_analysis(row['TP'], row['FP'], row['FN'])
+        report['groups'] = groups
+        report['frames'] = [{'group_name': child.name, **frame} for child in loader.children
+                            for frame in child.get_data()]
+    except Exception as e:
+        logger.exception("job %s failed", job['name'])
+        report['error'] = f"{type(e).__name__}: {e}"
+    return report
+
+
+def run_jobs(jobs: list[dict], options: dict) -> list[dict]:
+    """process pool entry point, the jobs of a group share the gt memo of the process, cleared after the group"""
+    try:
+        return [run_job(job, options) for job in jobs]
+    finally:
+        _gt_memo.clear()
+
+
+def run_batch(jobs: list[dict], workers: int | None = None, **options) -> list[dict]:
+    """the reports of all the {jobs} in the manifest order, the gt groups run in {workers} processes"""
+    chunks = group_jobs(jobs, workers or 1)
+    if workers:
+        with ProcessPoolExecutor(workers) as pool:
+            results = pool.map(run_jobs, chunks, [options] * len(chunks))
+            reports = [report for chunk in results for report in chunk]
+    else:
+        reports = [report for chunk in chunks for report in run_jobs(chunk, options)]
+    return sorted(reports, key=lambda report: report['index'])
+
+
+def write_report(path: str, reports: list[dict]):
+    """
+    a .json {path} holds all the reports, otherwise {path} is the csv of the groups rows of all the jobs
+    (FIELDS_NAMES after the job columns) and <path>_<model>_frames.csv the frames rows of the jobs of a model
+    (the model frames FIELDS_NAMES after the job columns and the group name)
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, mode='w') as f:
+            json.dump(reports, f, indent=2)
+        return
+    job_rows = [({field: report[field] for field in JOB_FIELDS_NAMES}, report) for report in reports]
+    for row, report in job_rows:
+        row['pred'] = ';'.join(row['pred']) if isinstance(row['pred'], list) else row['pred']
+    write_csv(path, JOB_FIELDS_NAMES + FIELDS_NAMES + ['error'],
+              [{**row, **group} for row, report in job_rows for group in report.get('groups', [])]
+              + [{**row, 'error': report['error']} for row, report in job_rows if 'error' in report])
+    for model, fields in FRAMES_FIELDS_NAMES.items():
+        if frames := [{**row, **frame} for row, report in job_rows if report['model'] == model
+                      for frame in report.get('frames', [])]:
+            write_csv(f"{os.path.splitext(path)[0]}_{model}_frames.csv", JOB_FIELDS_NAMES + ['group_name'] + fields,
+                      frames)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Evaluate the (gt, predictions, th, d_th) jobs of a manifest")
+    parser.add_argument(
+        'manifest',
+        type=str,
+        help="csv (model, gt, pred, th, d_th, name columns) or json (list of jobs) manifest, see load_manifest"
+    )
+    parser.add_argument(
+        '-o', '--out',
+        type=str,
+        required=True,
+        help="report path, .json for one json report, otherwise the groups csv (the frames csv are next to it)"
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="run the jobs in N processes, the jobs of a gt share its parsed data"
+    )
+    parser.add_argument(
+        '-b', '--backend',
+        type=str,
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="iou backend, torch falls back to numpy when it is not installed"
+    )
+    parser.add_argument(
+        '-t', '--threads',
+        type=int,
+        default=None,
+        help="torch intra-op threads count (torch backend only)"
+    )
+    parser.add_argument(
+        '-c', '--cache',
+        type=str,
+        default=None,
+        help="directory of the parsed gt/pred cache, parsed files are reused while they are unchanged"
+    )
+    parser.add_argument(
+        '--verify-cache',
+        action='store_true',
+        help="hash the cached files again on every hit, to detect edits keeping the file size and mtime"
+    )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help="json path of the wall time, calls count and memory peak of every stage of the run (main process)"
+    )
+    parser.add_argument(
+        '--cprofile',
+        type=str,
+        default=None,
+        help="path of a cProfile (pstats) dump of the run"
+    )
+    parser.add_argument(
+        '--log-level',
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default='WARNING',
+        help="logging level"
+    )
+    return parser.parse_args()
+
+
+def batch(args) -> int:
+    jobs = load_manifest(args.manifest)
+    reports = run_batch(jobs, args.workers, backend=args.backend, threads=args.threads, cache=args.cache,
+                        verify_cache=args.verify_cache)
+    write_report(args.out, reports)
+    failed = [report['job'] for report in reports if 'error' in report]
+    print(f"{len(reports) - len(failed)}/{len(reports)} jobs done, report: {args.out}")
+    if failed:
+        print(f"failed jobs: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    with profile_run(args.profile, args.cprofile):
+        status = batch(args)
+    raise SystemExit(status)
@@ -0,0 +1,160 @@
+"""
+time the loaders builds, the iou kernels and the exports on synthetic datasets at several scales.
+    python -m benchmarks.bench --scales small medium --out benchmarks/results/latest.json
+    python -m benchmarks.bench --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import numpy as np
+from BaseLoader import FIELDS_NAMES
+from helpers import write_csv
+from iou import BACKENDS, batch_evaluate, bboxes2pts, set_backend
+from ogi import FIELDS_NAMES as OGI_FIELDS_NAMES, OgiLoader
+from tnd import TndLoader
+from benchmarks.synthetic import frame_boxes, make_ogi, make_tnd, predict
+
+SCALES = {
+    'small': {'scenes': 10, 'frames': 20, 'boxes': 4},
+    'medium': {'scenes': 50, 'frames': 100, 'boxes': 6},
+    'large': {'scenes': 200, 'frames': 200, 'boxes': 8},
+}
+# the python iou backend is a reference loop, above this many frames it would dominate the run
+PYTHON_IOU_MAX_FRAMES = 2000
+REGRESSION_TOLERANCE = 1.2
+NOISE_FLOOR_S = 0.005  # smaller slowdowns are timer / file system noise
+DEFAULT_OUT = os.path.join(tempfile.gettempdir(), 'bench_latest.json')
+
+
+def timeit(func, repeat: int) -> dict:
+    """min and median wall time of {repeat} calls, the stdout of the timed code is dropped"""
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    return {'min_s': round(min(times), 6), 'median_s': round(statistics.median(times), 6), 'repeat': repeat}
+
+
+def ogi_loader(gt_dir: str, pred_path: str, **options) -> OgiLoader:
+    loader = OgiLoader(model='ogi', gt=gt_dir, pred=pred_path, th=0.5, d_th=0.3, **options)
+    loader.build()
+    return loader
+
+
+def tnd_loader(gt_path: str, pred_paths: list[str]) -> TndLoader:
+    loader = TndLoader(model='tnd', gt=[gt_path], pred=pred_paths, th=0.5)
+    loader.build()
+    return loader
+
+
+def frames_points(scale: dict, seed: int = 0) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """the gt and pred points of all the frames of a scale, for the iou kernels alone"""
+    rng = np.random.default_rng(seed)
+    gts = [frame_boxes(rng, scale['boxes']) for _ in range(scale['scenes'] * scale['frames'])]
+    return [bboxes2pts(gt) for gt in gts], [bboxes2pts(predict(rng, gt)[0]) for gt in gts]
+
+
+def bench_scale(name: str, scale: dict, root: str, repeat: int, workers: int | None) -> dict:
+    results = {}
+    frames = scale['scenes'] * scale['frames']
+    gt_dir, pred_path = make_ogi(os.path.join(root, 'ogi'), **scale)
+    gt_json, pred_paths = make_tnd(os.path.join(root, 'tnd'), frames, scale['boxes'], models=2)
+    gt_csv, _ = make_tnd(os.path.join(root, 'tnd_csv'), frames, scale['boxes'], gt_format='csv')
+
+    results['ogi_build'] = timeit(lambda: ogi_loader(gt_dir, pred_path), repeat)
+    if workers:
+        results[f'ogi_build_workers{workers}'] = timeit(lambda: ogi_loader(gt_dir, pred_path, workers=workers), repeat)
+    cache = os.path.join(root, 'cache')
+    ogi_loader(gt_dir, pred_path, cache=cache)  # warm the cache
+    results['ogi_build_cached'] = timeit(lambda: ogi_loader(gt_dir, pred_path, cache=cache), repeat)
+    results['tnd_build_json'] = timeit(lambda: tnd_loader(gt_json, pred_paths), repeat)
+    results['tnd_build_csv'] = timeit(lambda: tnd_loader(gt_csv, pred_paths[:1]), repeat)
+
+    gts, preds = frames_points(scale)
+    for backend in BACKENDS:
+        if (backend == 'python' and frames > PYTHON_IOU_MAX_FRAMES) or set_backend(backend) != backend:
+            continue
+        results[f'iou_{backend}'] = timeit(lambda: batch_evaluate(gts, preds, 0.5), repeat)
+    set_backend()
+
+    ogi = ogi_loader(gt_dir, pred_path)
+    tnd = tnd_loader(gt_json, pred_paths)
+    export_path = os.path.join(root, 'export.csv')
+    results['ogi_export_frames'] = timeit(
+        lambda: write_csv(export_path, OGI_FIELDS_NAMES,
+                          [frame.export_data() for child in ogi.children for frame in child.images]), repeat)
+    results['tnd_export_frames'] = timeit(lambda: tnd.children[0].export_data(export_path), repeat)
+    results['tnd_export_summary'] = timeit(lambda: write_csv(export_path, FIELDS_NAMES, tnd.export_data(export_path)),
+                                           repeat)
+    return {f'{case}@{name}': timing for case, timing in results.items()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    print the ratio of every case to the baseline
+    :return: the cases slower than {tolerance} x their baseline by more than NOISE_FLOOR_S
+    """
+    regressions = []
+    print(f"{'case':<40} {'baseline_s':>12} {'current_s':>12} {'ratio':>8}")
+    for case, timing in results.items():
+        if case not in baseline:
+            print(f"{case:<40} {'-':>12} {timing['min_s']:>12.6f} {'new':>8}")
+            continue
+        ratio = timing['min_s'] / baseline[case]['min_s'] if baseline[case]['min_s'] else float('inf')
+        slower = ratio > tolerance and timing['min_s'] - baseline[case]['min_s'] > NOISE_FLOOR_S
+        flag = ' <-- slower' if slower else ''
+        print(f"{case:<40} {baseline[case]['min_s']:>12.6f} {timing['min_s']:>12.6f} {ratio:>8.2f}{flag}")
+        if flag:
+            regressions.append(case)
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the loaders, iou kernels and exports")
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['small', 'medium'])
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the min is compared")
+    parser.add_argument('--workers', type=int, default=None, help="also time the ogi build in N processes")
+    parser.add_argument('--data', type=str, default=None, help="keep the synthetic datasets in this directory")
+    parser.add_argument('--out', type=str, default=DEFAULT_OUT,
+                        help="results json path, a temp file by default")
+    parser.add_argument('--baseline', type=str, default=None, help="results json to compare with")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help="a case slower than tolerance x its baseline is a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.scales:
+            root = os.path.join(args.data or tmp, name)
+            print(f"benchmarking {name}: {SCALES[name]}")
+            results.update(bench_scale(name, SCALES[name], root, args.repeat, args.workers))
+    report = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                       'numpy': np.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()},
+              'results': results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, mode='w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.out}")
+    if args.baseline:
+        with open(args.baseline, mode='r') as f:
+            baseline = json.load(f)['results']
+        if regressions := compare(results, baseline, args.tolerance):
+            raise SystemExit(f"{len(regressions)} regressions: {', '.join(regressions)}")
+    else:
+        for case, timing in results.items():
+            print(f"{case:<40} {timing['min_s']:>12.6f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""synthetic datasets in the ogi and tnd input layouts, for the benchmarks"""
+import argparse
+import csv
+import json
+import os
+import numpy as np
+
+WIDTH, HEIGHT = 640, 512
+HIT_RATE = 0.8  # share of the gt boxes the predictions find
+FALSE_RATE = 0.2  # extra random pred boxes per gt box
+
+
+def random_boxes(rng: np.random.Generator, count: int) -> np.ndarray:
+    """(count, 4) [x, y, w, h] boxes inside the frame"""
+    size = rng.uniform([10, 10], [120, 90], size=(count, 2))
+    corner = rng.uniform(0, 1, size=(count, 2)) * ([WIDTH, HEIGHT] - size)
+    return np.concatenate([corner, size], axis=1)
+
+
+def predict(rng: np.random.Generator, gt: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """pred boxes of a frame: jittered copies of most gt boxes and a few false ones, with their confidence"""
+    found = gt[rng.random(len(gt)) < HIT_RATE]
+    found = found + np.concatenate([rng.normal(0, 6, size=(len(found), 2)), np.zeros((len(found), 2))], axis=1)
+    boxes = np.concatenate([found, random_boxes(rng, rng.binomial(max(len(gt), 1), FALSE_RATE))])
+    return boxes, rng.random(len(boxes))
+
+
+def frame_boxes(rng: np.random.Generator, boxes: int) -> np.ndarray:
+    """the gt boxes of a frame, {boxes} on average"""
+    return random_boxes(rng, rng.poisson(boxes))
+
+
+def make_ogi(root: str, scenes: int, frames: int, boxes: int, seed: int = 0) -> tuple[str, str]:
+    """
+    ogi layout: a gt directory of one folder per scene holding its coco json, and one predictions json
+    of all the scenes cocos keyed by '<prefix>_<prefix>_<scene_name>_<suffix>' (see helpers.re_scene_name)
+    :return: the gt directory and the predictions path
+    """
+    rng = np.random.default_rng(seed)
+    gt_dir, pred_path = os.path.join(root, 'gt'), os.path.join(root, 'predictions.json')
+    pred_scenes = {}
+    for s in range(scenes):
+        name = f'scene{s:05d}'
+        gt = {'images': [], 'annotations': []}
+        pred = {'images': [], 'annotations': []}
+        for f in range(frames):
+            file_name = f'{name}_frame{f:05d}.jpg'
+            gt_boxes = frame_boxes(rng, boxes)
+            pred_boxes, confidence = predict(rng, gt_boxes)
+            for coco in (gt, pred):
+                coco['images'].append({'id': f, 'file_name': file_name, 'width': WIDTH, 'height': HEIGHT})
+            gt['annotations'] += [{'id': len(gt['annotations']) + i, 'image_id': f, 'bbox': bbox}
+                                  for i, bbox in enumerate(gt_boxes.tolist())]
+            pred['annotations'] += [{'id': len(pred['annotations']) + i, 'image_id': f, 'bbox': bbox, 'confidence': score}
+                                    for i, (bbox, score) in enumerate(zip(pred_boxes.tolist(), confidence.tolist()))]
+        os.makedirs(os.path.join(gt_dir, name), exist_ok=True)
+        write_json(os.path.join(gt_dir, name, 'annotations.json'), gt)
+        pred_scenes[f'model_v1_{name}_thermal'] = pred
+    write_json(pred_path, {'scenes': pred_scenes})
+    return gt_dir, pred_path
+
+
+def make_tnd(root: str, frames: int, boxes: int, models: int = 1, gt_format: str = 'json',
+             seed: int = 0) -> tuple[str, list[str]]:
+    """
+    tnd layout: a coco json (or a csv of one row per box) gt of all the frames, and one predictions json
+    per model of one record per frame
+    :return: the gt path and the predictions paths
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(root, exist_ok=True)
+    names = [f'frame{f:06d}' for f in range(frames)]
+    gt_boxes = [frame_boxes(rng, boxes) for _ in names]
+    if gt_format == 'csv':
+        gt_path = os.path.join(root, 'gt.csv')
+        with open(gt_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Thermal Image', 'X_min', 'Y_min', 'X_max', 'Y_max'])
+            # extract_gt_csv keeps the '__' separated parts 3 to -1 of the image name
+            writer.writerows([f'a__b__c__{name}__thermal.png', x, y, x + w, y + h]
+                             for name, bboxes in zip(names, gt_boxes) for x, y, w, h in bboxes.tolist())
+    else:
+        gt_path = os.path.join(root, 'gt.json')
+        images = [{'id': i, 'file_name': f'{name}.jpg', 'width': WIDTH, 'height': HEIGHT}
+                  for i, name in enumerate(names)]
+        annotations = [{'image_id': i, 'bbox': bbox} for i, bboxes in enumerate(gt_boxes) for bbox in bboxes.tolist()]
+        write_json(gt_path, {'images': images,
+                             'annotations': [{'id': i, **ann} for i, ann in enumerate(annotations)]})
+    pred_paths = []
+    for m in range(models):
+        records = [{'thermal_name': f'{name}.jpg', 'rgb_name': f'{name}_rgb.jpg', 'thermal_shape': [HEIGHT, WIDTH],
+                    'bboxes': predict(rng, bboxes)[0].tolist()} for name, bboxes in zip(names, gt_boxes)]
+        pred_paths.append(os.path.join(root, f'model{m}.json'))
+        write_json(pred_paths[-1], records)
+    return gt_path, pred_paths
+
+
+def write_json(path: str, data):
+    with open(path, mode='w') as f:
+        json.dump(data, f)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ogi or tnd dataset")
+    parser.add_argument('layout', choices=('ogi', 'tnd'))
+    parser.add_argument('root', type=str, help="output directory")
+    parser.add_argument('--scenes', type=int, default=10, help="ogi scenes count")
+    parser.add_argument('--frames', type=int, default=50, help="frames per ogi scene, tnd frames count")
+    parser.add_argument('--boxes', type=int, default=4, help="average gt boxes per frame")
+    parser.add_argument('--models', type=int, default=1, help="tnd predictions files count")
+    parser.add_argument('--gt-format', choices=('json', 'csv'), default='json', help="tnd gt format")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    if args.layout == 'ogi':
+        print(make_ogi(args.root, args.scenes, args.frames, args.boxes, args.seed))
+    else:
+        print(make_tnd(args.root, args.frames, args.boxes, args.models, args.gt_format, args.seed))
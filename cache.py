@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+
+CACHE_MAX_BYTES = 4 << 30
+HASH_BLOCK_SIZE = 1 << 20  # read size of the streamed file hash
+GROUPS_CHUNK_FRAMES = 1 << 14  # frames of the groups written together by a GroupsWriter
+META_FILE = 'meta.json'
+FRAME_FIELDS = ('file_name', 'thermal_name', 'rgb_name', 'width', 'height')
+NAME_FIELDS = ('file_name', 'thermal_name', 'rgb_name')  # stored as str arrays, a missing (None) name is ''
+
+
+def file_hash(path: str) -> str:
+    """hash of the whole file content"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, mode='rb') as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def arrays_hash(arrays: dict[str, np.ndarray]) -> str:
+    """hash of named arrays, their dtype, shape and content"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        digest.update(f'{name}|{array.dtype.str}|{array.shape}'.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def frames_to_arrays(frames: list[dict]) -> dict[str, np.ndarray]:
+    """
+    extracted frames records to columnar arrays:
+        one array per FRAME_FIELDS field found in the records, all the bboxes in one (N, 4) 'boxes' array
+        with per frame 'offsets', and a 'confidence' array when the records have one.
+    a None name would make an object array that np.save refuses, it is stored as ''.
+    """
+    fields = [field for field in FRAME_FIELDS if frames and field in frames[0]]
+    arrays = {field: np.asarray(['' if frame[field] is None else frame[field] for frame in frames], dtype=str)
+              if field in NAME_FIELDS else np.asarray([frame[field] for frame in frames]) for field in fields}
+    lengths = [len(frame['bboxes']) for frame in frames]
+    arrays['offsets'] = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])
+    arrays['boxes'] = np.concatenate([np.asarray(frame['bboxes'], dtype=np.float64).reshape(-1, 4)
+                                      for frame in frames] + [np.zeros((0, 4))])
+    if frames and 'confidence' in frames[0]:
+        arrays['confidence'] = np.concatenate([np.asarray(frame['confidence'], dtype=np.float64)
+                                               for frame in frames] + [np.zeros(0)])
+    return arrays
+
+
+def arrays_to_frames(arrays: dict[str, np.ndarray]) -> list[dict]:
+    """frames records back from frames_to_arrays, their bboxes/confidence are views into the cached arrays"""
+    columns = {field: arrays[field].tolist() for field in FRAME_FIELDS if field in arrays}
+    for field in NAME_FIELDS:
+        if field in columns:
+            columns[field] = [name or None for name in columns[field]]
+    offsets = arrays['offsets'].tolist()
+    frames = []
+    for i, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+        frame = {field: values[i] for field, values in columns.items()}
+        frame['bboxes'] = arrays['boxes'][start:end]
+        if 'confidence' in arrays:
+            frame['confidence'] = arrays['confidence'][start:end]
+        frames.append(frame)
+    return frames
+
+
+def groups_to_arrays(groups: list[list[dict]]) -> dict[str, np.ndarray]:
+    """the frames of many groups (scenes, files) as the frames_to_arrays of all of them and the frames 'counts'"""
+    arrays = frames_to_arrays([frame for frames in groups for frame in frames])
+    arrays['counts'] = np.asarray([len(frames) for frames in groups], dtype=np.int64)
+    return arrays
+
+
+def arrays_to_groups(arrays: dict[str, np.ndarray]) -> list[list[dict]]:
+    frames = arrays_to_frames(arrays)
+    ends = np.cumsum(arrays['counts']).tolist()
+    return [frames[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def sources_hash(sources: list[str]) -> str:
+    """the file_hash of one source, or a hash of the file_hash of every source"""
+    if len(sources) == 1:
+        return file_hash(sources[0])
+    return hashlib.blake2b('|'.join(map(file_hash, sources)).encode(), digest_size=16).hexdigest()
+
+
+class BoxCache:
+    """
+    on disk cache of extracted frames, every entry is a directory of raw .npy arrays loaded memory mapped.
+    an entry is keyed by the path, size and mtime of its source files (one file, or many small files like the
+    cocos of a gt directory), so a changed source is a new entry. the entry meta keeps the file_hash of the sources,
+    with {verify} a hit is hashed again so an edit keeping the size and mtime is detected too.
+    above {max_bytes} the least recently used entries are evicted.
+    """
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, verify: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.size: int | None = None  # bytes of the entries, scanned on the first commit then kept up to date
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def source_info(source: str) -> tuple[str, int, int]:
+        stat = os.stat(source)
+        return os.path.abspath(source), stat.st_size, stat.st_mtime_ns
+
+    def entry_path(self, sources: list[str], kind: str) -> str:
+        key = '|'.join(map(str, (kind, *(info for source in sources for info in self.source_info(source)))))
+        return os.path.join(self.path, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+    def read_entry(self, source: str | list[str], kind: str) -> tuple[str, dict] | None:
+        """the (entry path, meta) of {source}, None when missing or stale"""
+        sources = [source] if isinstance(source, str) else source
+        entry = self.entry_path(sources, kind)
+        try:
+            meta = read_meta(entry)
+        except (OSError, ValueError):
+            return None
+        if self.verify and meta['hash'] != sources_hash(sources):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        try:
+            os.utime(os.path.join(entry, META_FILE))  # mark as recently used
+        except FileNotFoundError:  # evicted meanwhile by another process
+            return None
+        return entry, meta
+
+    def load(self, source: str | list[str], kind: str) -> dict[str, np.ndarray] | None:
+        """the cached arrays of {source} (a path or a list of paths), None when missing or stale"""
+        if (found := self.read_entry(source, kind)) is None:
+            return None
+        entry, meta = found
+        try:
+            return {name: np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+                    for name in meta.get('arrays', [])}
+        except FileNotFoundError:  # evicted meanwhile by another process
+            return None
+
+    def load_groups(self, source: str, kind: str):
+        """
+        an iterator of the cached (group_name, frames) groups of {source} (see GroupsWriter) read one chunk
+        of groups at a time, None when missing or stale. a chunk evicted while iterating raises FileNotFoundError
+        """
+        if (found := self.read_entry(source, kind)) is None or 'groups' not in found[1]:
+            return None
+        entry, meta = found
+        return self._iter_groups(entry, meta['groups'], meta['chunks'])
+
+    @staticmethod
+    def _iter_groups(entry: str, names: list[str], chunks: int):
+        names = iter(names)
+        for i in range(chunks):
+            with np.load(os.path.join(entry, f'chunk_{i}.npz'), allow_pickle=False) as data:
+                groups = arrays_to_groups({key: data[key] for key in data.files})
+            for frames in groups:
+                yield next(names), frames
+
+    def store(self, source: str | list[str], kind: str, arrays: dict[str, np.ndarray]):
+        """write the arrays of {source} to a temporary directory then move it in place"""
+        tmp = self.make_tmp()
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f'{name}.npy'), array, allow_pickle=False)
+        self.commit(tmp, source, kind, {'arrays': list(arrays)})
+
+    def groups_writer(self, source: str, kind: str) -> 'GroupsWriter':
+        return GroupsWriter(self, source, kind)
+
+    def make_tmp(self) -> str:
+        tmp = os.path.join(self.path, f'.tmp_{uuid.uuid4().hex}')
+        os.makedirs(tmp)
+        return tmp
+
+    def commit(self, tmp: str, source: str | list[str], kind: str, content: dict):
+        """write the meta of the {tmp} entry of {source}, then move it in place"""
+        sources = [source] if isinstance(source, str) else source
+        entry = self.entry_path(sources, kind)
+        meta = {'kind': kind, 'sources': [self.source_info(path) for path in sources], 'hash': sources_hash(sources),
+                **content}
+        with open(os.path.join(tmp, META_FILE), mode='w') as f:
+            json.dump(meta, f)
+        size = entry_size(tmp)
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(tmp, entry)
+        except OSError:  # stored meanwhile by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        if self.size is None:
+            self.evict()
+        else:
+            self.size += size
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """delete the least recently used entries until the cache fits in {self.max_bytes}"""
+        entries = []
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            if name.startswith('.tmp_') or not os.path.isfile(os.path.join(entry, META_FILE)):
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(entry, META_FILE)), entry_size(entry), entry))
+            except FileNotFoundError:  # evicted meanwhile by another process
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        self.size = total
+
+
+class GroupsWriter:
+    """
+    write the (group_name, frames) groups of a streamed source, like the scenes of a predictions file,
+    to a BoxCache entry as chunks of about {chunk_frames} frames, so caching never holds more than one chunk
+    in memory and loading it back does not open one file per group.
+    commit moves the entry in place, close without commit drops it.
+    """
+    def __init__(self, cache: BoxCache, source: str, kind: str, chunk_frames: int = GROUPS_CHUNK_FRAMES):
+        self.cache = cache
+        self.source = source
+        self.kind = kind
+        self.chunk_frames = chunk_frames
+        self.names: list[str] = []
+        self.chunk: list[list[dict]] = []
+        self.chunks = 0
+        self.tmp: str | None = cache.make_tmp()
+
+    def add(self, name: str, frames: list[dict]):
+        self.names.append(name)
+        self.chunk.append(frames)
+        if sum(map(len, self.chunk)) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        if self.chunk:
+            np.savez(os.path.join(self.tmp, f'chunk_{self.chunks}.npz'), **groups_to_arrays(self.chunk))
+            self.chunk = []
+            self.chunks += 1
+
+    def commit(self):
+        self.flush()
+        self.cache.commit(self.tmp, self.source, self.kind, {'groups': self.names, 'chunks': self.chunks})
+        self.tmp = None
+
+    def close(self):
+        if self.tmp:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+            self.tmp = None
+
+
+class ResultStore:
+    """
+    evaluation results of many keys (scenes) saved as one .npz per key, with the fingerprint of the inputs
+    they were computed from. a result is only loaded back while its fingerprint is unchanged.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f'{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}.npz')
+
+    def load(self, key: str, fingerprint: str) -> dict[str, np.ndarray] | None:
+        try:
+            with np.load(self.entry_path(key), allow_pickle=False) as data:
+                if str(data['fingerprint']) != fingerprint:
+                    return None
+                return {name: data[name] for name in data.files if name != 'fingerprint'}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, key: str, fingerprint: str, arrays: dict[str, np.ndarray]):
+        """write to a temporary file then replace the previous result"""
+        tmp = os.path.join(self.path, f'.tmp_{uuid.uuid4().hex}')
+        with open(tmp, mode='wb') as f:
+            np.savez(f, fingerprint=np.asarray(fingerprint), **arrays)
+        os.replace(tmp, self.entry_path(key))
+
+
+def entry_size(entry: str) -> int:
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def read_meta(entry: str) -> dict:
+    with open(os.path.join(entry, META_FILE), mode='r') as f:
+        return json.load(f)
+
+
+def load_frames(cache: BoxCache | None, source: str, kind: str, extract) -> list[dict]:
+    """the extracted frames of {source}, from the cache when it holds them, otherwise from extract(source)"""
+    if cache is None:
+        return extract(source)
+    if (arrays := cache.load(source, kind)) is not None:
+        return arrays_to_frames(arrays)
+    frames = extract(source)
+    cache.store(source, kind, frames_to_arrays(frames))
+    return frames
+
+
+def load_frames_groups(cache: BoxCache | None, sources: list[str], kind: str, extract) -> list[list[dict]]:
+    """
+    the extracted frames of every one of {sources}, cached all together in one entry: many small sources
+    (the scenes cocos of a gt directory) would otherwise each pay the opening of its own entry
+    """
+    if cache is None:
+        return [extract(source) for source in sources]
+    if (arrays := cache.load(sources, kind)) is not None:
+        return arrays_to_groups(arrays)
+    groups = [extract(source) for source in sources]
+    cache.store(sources, kind, groups_to_arrays(groups))
+    return groups
@@ -0,0 +1,82 @@
+from typing import NamedTuple
+import numpy as np
+from helpers import get_f1_score, get_precision, get_recall
+
+CURVE_FIELDS_NAMES = ['group_name', 'GT', 'PREDICT', 'AP', 'CONFIDENCE', 'TP', 'FP', 'RECALL', 'PRECISION', 'F1_SCORE']
+POINTS_FIELDS_NAMES = ['group_name', 'CONFIDENCE', 'TP', 'FP', 'RECALL', 'PRECISION']
+
+
+class Curve(NamedTuple):
+    """
+    precision / recall of the preds kept above every confidence cut-off, the cut-offs are the distinct
+    pred confidences from the highest to the lowest
+    """
+    gt_count: int
+    pred_count: int
+    confidence: np.ndarray
+    tp: np.ndarray
+    fp: np.ndarray
+
+    @property
+    def recall(self) -> np.ndarray:
+        return self.tp / self.gt_count if self.gt_count else np.zeros(len(self.tp))
+
+    @property
+    def precision(self) -> np.ndarray:
+        total = self.tp + self.fp
+        return np.divide(self.tp, total, out=np.zeros(len(total)), where=total != 0)
+
+    @property
+    def ap(self) -> float:
+        """area under the monotone (from the right) envelope of the precision"""
+        envelope = np.maximum.accumulate(self.precision[::-1])[::-1]
+        return float(np.sum(np.diff(self.recall, prepend=0) * envelope))
+
+    def best(self) -> int:
+        """index of the cut-off with the best f1 score, -1 for an empty curve"""
+        recall, precision = self.recall, self.precision
+        total = recall + precision
+        f1 = np.divide(2 * recall * precision, total, out=np.zeros(len(total)), where=total != 0)
+        return int(np.argmax(f1)) if len(f1) else -1
+
+    def summary(self, group_name: str) -> dict:
+        """the ap and the best f1 operating point"""
+        row = {'group_name': group_name, 'GT': self.gt_count, 'PREDICT': self.pred_count, 'AP': round(self.ap, 4)}
+        if (i := self.best()) < 0:
+            return {**row, 'CONFIDENCE': None, 'TP': 0, 'FP': 0, 'RECALL': 0, 'PRECISION': 0, 'F1_SCORE': 0}
+        tp, fp = int(self.tp[i]), int(self.fp[i])
+        recall, precision = get_recall(tp, self.gt_count - tp), get_precision(tp, fp)
+        return {**row, 'CONFIDENCE': round(float(self.confidence[i]), 4), 'TP': tp, 'FP': fp,
+                'RECALL': recall, 'PRECISION': precision, 'F1_SCORE': get_f1_score(recall, precision)}
+
+    def points(self, group_name: str) -> list[dict]:
+        return [{'group_name': group_name, 'CONFIDENCE': confidence, 'TP': tp, 'FP': fp,
+                 'RECALL': round(recall, 4), 'PRECISION': round(precision, 4)}
+                for confidence, tp, fp, recall, precision in zip(self.confidence.tolist(), self.tp.tolist(),
+                                                                 self.fp.tolist(), self.recall.tolist(),
+                                                                 self.precision.tolist())]
+
+
+def pr_curve(gt_confidence: np.ndarray, confidence: np.ndarray, hits: np.ndarray) -> Curve:
+    """
+    sort the preds once by confidence and count the tp / fp of every cut-off with prefix sums.
+    :param gt_confidence: per gt box, the highest confidence of the preds hitting it (-inf without hit),
+                          see SceneBuffer.hit_confidence
+    :param confidence: per pred box its confidence
+    :param hits: per pred box whether it hits a gt box, a pred without hit is a fp
+    """
+    order = np.argsort(-confidence, kind='stable')
+    confidence = confidence[order]
+    fp = np.cumsum(~hits[order])
+    # a cut-off keeps all the preds of its confidence, so only the last one of equal confidences is a point
+    last = np.flatnonzero(np.append(confidence[1:] != confidence[:-1], True)) if len(confidence) else order
+    confidence, fp = confidence[last], fp[last]
+    gt_sorted = np.sort(gt_confidence)
+    tp = len(gt_sorted) - np.searchsorted(gt_sorted, confidence, side='left')
+    return Curve(len(gt_confidence), len(hits), confidence, tp, fp)
+
+
+def merge_curves_inputs(inputs: list[tuple[np.ndarray, np.ndarray, np.ndarray]]):
+    """concatenate the (gt_confidence, confidence, hits) inputs of many groups into the inputs of the overall curve"""
+    return tuple(np.concatenate([group[i] for group in inputs] + [np.zeros(0, dtype=dtype)])
+                 for i, dtype in enumerate((np.float64, np.float64, bool)))
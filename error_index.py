@@ -0,0 +1,74 @@
+import numpy as np
+
+ERROR_KINDS = ('any', 'fn', 'fp', 'both')  # frames with a miss or a false alarm, a miss, a false alarm, both
+
+
+def error_frames(counts: np.ndarray) -> dict[str, np.ndarray]:
+    """the sorted indexes of the error frames of every kind from the (F, 3) per frame tp, fp, fn counts"""
+    fp, fn = counts[:, 1] > 0, counts[:, 2] > 0
+    return {'any': np.flatnonzero(fp | fn), 'fn': np.flatnonzero(fn), 'fp': np.flatnonzero(fp),
+            'both': np.flatnonzero(fp & fn)}
+
+
+class ErrorFrameIndex:
+    """
+    the error frames of every scene of a loader and of all of them, so the viewer jumps from an error frame
+    to the next one instead of stepping through the clean frames.
+    globally a frame is the position scene offset + frame index, the global arrays are rebuilt on the first
+    jump after a scene changed.
+    """
+    def __init__(self):
+        self._sizes: list[int] = []  # frames count of every scene
+        self._scenes: list[dict[str, np.ndarray]] = []
+        self._offsets: np.ndarray | None = None
+        self._global: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_loader(cls, loader) -> 'ErrorFrameIndex':
+        index = cls()
+        for i, child in enumerate(loader.children):
+            index.set_scene(i, child.buffer.counts if child.images else np.zeros((0, 3), dtype=np.int64))
+        return index
+
+    def set_scene(self, scene_index: int, counts: np.ndarray):
+        """index the (F, 3) frames counts of a scene, a new scene or a scene evaluated again"""
+        while len(self._scenes) <= scene_index:
+            self._sizes.append(0)
+            self._scenes.append(error_frames(np.zeros((0, 3), dtype=np.int64)))
+        self._sizes[scene_index] = len(counts)
+        self._scenes[scene_index] = error_frames(counts)
+        self._offsets = None
+
+    def scene_frames(self, scene_index: int, kind: str = 'any') -> np.ndarray:
+        return self._scenes[scene_index][kind]
+
+    def global_frames(self, kind: str = 'any') -> np.ndarray:
+        """the sorted global positions of the {kind} error frames of all the scenes"""
+        if self._offsets is None:
+            self._offsets = np.concatenate([[0], np.cumsum(self._sizes, dtype=np.int64)])
+            self._global = {}
+        if kind not in self._global:
+            self._global[kind] = np.concatenate([offset + scene[kind] for offset, scene
+                                                 in zip(self._offsets[:-1].tolist(), self._scenes)]
+                                                + [np.zeros(0, dtype=np.int64)])
+        return self._global[kind]
+
+    def count(self, kind: str = 'any') -> int:
+        return len(self.global_frames(kind))
+
+    def step(self, kind: str, scene_index: int, frame_index: int, step: int = 1) -> tuple[int, int] | None:
+        """
+        the (scene, frame) of the next ({step} > 0) or previous {kind} error frame from the frame {frame_index}
+        of the scene {scene_index} over all the scenes, wrapping around. None without any such frame
+        """
+        frames = self.global_frames(kind)
+        if not len(frames):
+            return None
+        position = self._offsets[scene_index] + frame_index
+        if step > 0:
+            i = np.searchsorted(frames, position, side='right') % len(frames)
+        else:
+            i = np.searchsorted(frames, position, side='left') - 1
+        position = int(frames[i])
+        scene = int(np.searchsorted(self._offsets, position, side='right')) - 1
+        return scene, position - int(self._offsets[scene])
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+NGRAM = 3
+
+
+def ngrams(text: str, n: int = NGRAM) -> set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class FrameSearchIndex:
+    """
+    substring search over the frame names of all the scenes of a loader.
+    every name is split into its 3-grams, a query is the intersection of the postings of its 3-grams checked
+    against the names (shorter queries scan the names). a query extending the previous one only filters
+    the previous hits, so searching as you type narrows down instead of searching again.
+    """
+    def __init__(self):
+        self.names: list[str] = []
+        self.locations: list[tuple[int, int]] = []  # (scene index, frame index) of every entry
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        self._frames: dict[tuple[int, str], int] = {}  # (scene index, frame name) -> frame index
+        self._scenes: dict[int, range] = {}  # the entries of every scene
+        self._removed: set[int] = set()
+        self._last: tuple[str, list[int]] | None = None
+
+    @classmethod
+    def from_loader(cls, loader) -> 'FrameSearchIndex':
+        index = cls()
+        for i, child in enumerate(loader.children):
+            index.add_scene(i, [image.name for image in child.images])
+        return index
+
+    def add_scene(self, scene_index: int, names: list[str]):
+        """index the frame {names} of a scene, a scene added again replaces its previous frames"""
+        if (old := self._scenes.get(scene_index)) is not None:
+            self._removed.update(old)
+            for name in map(self.names.__getitem__, old):
+                self._frames.pop((scene_index, name), None)
+        start = len(self.names)
+        for frame_index, name in enumerate(names):
+            entry = start + frame_index
+            self.names.append(name)
+            self.locations.append((scene_index, frame_index))
+            self._frames.setdefault((scene_index, name), frame_index)
+            for gram in ngrams(name):
+                self._postings[gram].append(entry)
+        self._scenes[scene_index] = range(start, len(self.names))
+        self._last = None
+
+    def search(self, query: str) -> list[int]:
+        """the sorted entries whose frame name contains {query}, see location"""
+        if not query:
+            return []
+        if self._last and self._last[0] in query:
+            candidates = self._last[1]
+        elif len(query) < NGRAM:
+            candidates = range(len(self.names))
+        else:
+            postings = sorted((self._postings.get(gram, []) for gram in ngrams(query)), key=len)
+            common = set(postings[0]).intersection(*postings[1:])
+            candidates = sorted(common)
+        hits = [entry for entry in candidates if query in self.names[entry] and entry not in self._removed]
+        self._last = (query, hits)
+        return hits
+
+    def location(self, entry: int) -> tuple[int, int]:
+        return self.locations[entry]
+
+    def frame_index(self, scene_index: int, name: str) -> int | None:
+        """the index of the frame {name} in the scene {scene_index}"""
+        return self._frames.get((scene_index, name))
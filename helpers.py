@@ -2,18 +2,23 @@ import json
 import csv
 import re
 import os
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+from profiler import profiled
 
 
 def is_csv(path: str) -> bool:
     return os.path.splitext(path)[1].lower() == '.csv'
 
 
+@profiled('read_csv')
 def read_csv(path: str) -> list:
     with open(path, mode='r') as f:
         data = csv.DictReader(f)
         return [row for row in data]
 
 
+@profiled('export')
 def write_csv(path: str, field_names: list, data: list[dict]) -> None:
     with open(path, 'w', newline='') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=field_names)
@@ -21,15 +26,107 @@ def write_csv(path: str, field_names: list, data: list[dict]) -> None:
         writer.writerows(data)
 
 
+@profiled('read_json')
 def read_json(path: str) -> dict:
     with open(path, mode='r') as f:
         return json.load(f)
 
 
 def read_jsons(path: str) -> list[dict]:
+    """every json of {path}, each file is profiled by read_json"""
     return [read_json(p) for p in path]
 
 
+STREAM_CHUNK_SIZE = 1 << 20
+JSON_WHITESPACES = ' \t\n\r'
+JSON_NUMBER_CHARS = '0123456789+-.eE'
+
+
+class JsonStream:
+    """incremental json reader, values are decoded with raw_decode from a buffer that is refilled on demand"""
+    def __init__(self, file, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self, size: int):
+        """drop the consumed part of the buffer and append the next {size} chars of the file"""
+        data = self.file.read(size)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+
+    def peek(self) -> str:
+        """skip whitespaces and return the next char, '' at the end of the file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in JSON_WHITESPACES:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.read(self.chunk_size)
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} but found {char!r} in {self.file.name}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """decode the next json value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number cut by the end of the buffer may continue in the next chunk
+                if self.eof or type(value) not in (int, float) or self.buffer[end:].strip(JSON_NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # read at least the pending size again, so a big value is decoded a logarithmic number of times
+            self.read(max(self.chunk_size, len(self.buffer) - self.pos))
+
+    def keys(self):
+        """
+        walk the next json object key by key, the caller must consume the value of each yielded key
+        (with value or items) before asking for the next key
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def items(self):
+        """yield the (key, value) items of the next json object one by one"""
+        for key in self.keys():
+            yield key, self.value()
+
+
+def iter_json_items(path: str, key: str, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    stream the items of the object stored under the top level {key} of a json file, one (name, value) at a time.
+    the other top level values are decoded and dropped, so memory is bounded by the biggest single item.
+    """
+    with open(path, mode='r') as f:
+        stream = JsonStream(f, chunk_size)
+        for name in stream.keys():
+            if name == key:
+                yield from stream.items()
+            else:
+                stream.value()
+
+
 def re_scene_name(name):
     pattern = r'^[^_]+_[^_]+_(.+)_[^_]+$'
     match = re.match(pattern, name)
@@ -39,6 +136,7 @@ def re_scene_name(name):
         return ''
 
 
+@profiled('extract')
 def extract_pred_json(data):
     return [{
         'thermal_name': d['thermal_name'],
@@ -49,6 +147,7 @@ def extract_pred_json(data):
     } for d in data]
 
 
+@profiled('extract')
 def extract_gt_csv(datas):
     def extract_file_name(filename):
         return '__'.join(filename.split('__')[3:-1]) + '.jpg'
@@ -66,21 +165,76 @@ def extract_cocos(cocos, bboxes_callback=None):
     return [extract_coco(coco, bboxes_callback if bboxes_callback else get_gt_bboxes) for coco in cocos][0]
 
 
+@profiled('extract')
 def extract_coco(coco, bboxes_callback):
+    annotations = index_annotations(coco)
     return [{
         'file_name': image['file_name'],
         'width': image['width'],
         'height': image['height'],
-        'bboxes': bboxes_callback(coco, image)
+        'bboxes': bboxes_callback(annotations.get(image['id'], []))
     }for image in coco['images']]
 
 
-def get_gt_bboxes(coco, image):
-    return [a['bbox'] for a in coco['annotations'] if a['image_id'] == image['id']]
+def index_annotations(coco) -> dict[int, list[dict]]:
+    """group the coco annotations by image_id in one pass over the annotations list"""
+    index = {}
+    for annotation in coco['annotations']:
+        index.setdefault(annotation['image_id'], []).append(annotation)
+    return index
+
+
+def frame_key(name: str) -> str:
+    """
+    normalized key used to join gt and pred frames:
+        path separators are unified and the relative path is kept, so 'day1\\a.jpg' and 'day1/a.jpg' join on
+        'day1/a.jpg' while 'day2/a.jpg' stays another frame. keys are compared exactly (case sensitive),
+        there is no substring matching.
+    """
+    return name.replace('\\', '/').strip()
+
+
+@profiled('join')
+def index_frames(frames: list[dict], name_field: str) -> dict[str, list[dict]]:
+    """group frames records by the frame_key of their name_field"""
+    index = {}
+    for frame in frames:
+        index.setdefault(frame_key(frame[name_field]), []).append(frame)
+    return index
+
+
+@profiled('join')
+def join_frames(gt_index: dict, pred_index: dict) -> list[tuple[str, list[dict], list[dict]]]:
+    """inner join of two frames indexes, one (key, gt_frames, pred_frames) entry per common key sorted by key"""
+    return [(key, gt_index[key], pred_index[key]) for key in sorted(gt_index.keys() & pred_index.keys())]
+
 
+class ParsedGt(NamedTuple):
+    """read only parsed gt, its extracted frames and their frame_key index, safe to share between evaluations"""
+    frames: tuple[dict, ...]
+    index: Mapping[str, tuple[dict, ...]]
 
-def get_pred_bboxes(coco, image):
-    return [[a['bbox'], a['confidence']]for a in coco['annotations'] if a['image_id'] == image['id']]
+
+def parse_gt(frames: list[dict], name_field: str = 'file_name') -> ParsedGt:
+    index = {key: tuple(group) for key, group in index_frames(frames, name_field).items()}
+    return ParsedGt(tuple(frames), MappingProxyType(index))
+
+
+def get_gt_bboxes(annotations):
+    return [a['bbox'] for a in annotations]
+
+
+@profiled('extract')
+def extract_pred_coco(coco):
+    """like extract_coco with the pred bboxes and their confidence in two aligned lists"""
+    annotations = index_annotations(coco)
+    return [{
+        'file_name': image['file_name'],
+        'width': image['width'],
+        'height': image['height'],
+        'bboxes': [a['bbox'] for a in annotations.get(image['id'], [])],
+        'confidence': [a['confidence'] for a in annotations.get(image['id'], [])]
+    } for image in coco['images']]
 
 
 def get_recall(tp, fn):
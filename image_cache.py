@@ -0,0 +1,157 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image
+
+IMAGE_CACHE_BYTES = 512 << 20
+PREFETCH_FRAMES = 3  # frames decoded ahead on each side of the current one
+PREFETCH_WORKERS = 2
+PYRAMID_LEVELS = 4  # a frame is decoded at 1, 1/2, 1/4 or 1/8 of its size, see decode_level
+
+
+def fit_size(image_size: tuple[int, int], box: tuple[int, int]) -> tuple[float, float]:
+    """the size of an image fitted into the {box} (width, height) keeping its aspect ratio"""
+    iw, ih = image_size
+    mw, mh = box
+    if iw > ih:
+        ih = ih * (mw / iw)
+        r = mh / ih if (ih / mh) > 1 else 1
+        iw, ih = mw * r, ih * r
+    else:
+        iw = iw * (mh / ih)
+        r = mw / iw if (iw / mw) > 1 else 1
+        iw, ih = iw * r, mh * r
+    return iw, ih
+
+
+def pyramid_level(source_size: tuple[int, int], size: tuple[int, int]) -> int:
+    """the coarsest pyramid level (the source reduced by 2 ** level) still at least {size}"""
+    ratio = min(source_size[0] / size[0], source_size[1] / size[1])
+    return min(int(math.log2(ratio)), PYRAMID_LEVELS - 1) if ratio >= 1 else 0
+
+
+def decode_level(path: str, level: int) -> Image.Image:
+    """
+    decode an image reduced by 2 ** level without decoding it whole when possible:
+    jpeg draft makes the decoder itself scale by 1/2, 1/4 or 1/8, other formats are reduced after decoding
+    """
+    factor = 2 ** level
+    with Image.open(path) as image:
+        size = (max(image.width // factor, 1), max(image.height // factor, 1))
+        if image.format == 'JPEG':
+            image.draft(image.mode, size)
+        image.load()
+        # a closed image loses its data, reduce / copy keep it
+        reduce = min(image.width // size[0], image.height // size[1])
+        return image.reduce(reduce) if reduce > 1 else image.copy()
+
+
+def image_bytes(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache:
+    """
+    decoded and resized images keyed by (path, target size), the least recently used are dropped above {max_bytes}.
+    prefetch decodes images in background threads, get returns a cached image, waits for one being prefetched
+    or decodes it. only PIL images are made here, the PhotoImage must be created on the Tk thread.
+    the decoded pyramid levels of a frame are cached too (keyed by (path, 'level', level)), so a new target size
+    (window resize, Slide.scale zoom) is resized from the cheapest cached level at least that size.
+    """
+    def __init__(self, max_bytes: int = IMAGE_CACHE_BYTES, workers: int = PREFETCH_WORKERS):
+        self.max_bytes = max_bytes
+        self._images: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._bytes = 0
+        self._sizes: dict[str, tuple[int, int]] = {}  # source size of every seen path
+        self._pending: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='prefetch')
+
+    def source_size(self, path: str) -> tuple[int, int]:
+        if (size := self._sizes.get(path)) is None:
+            with Image.open(path) as image:  # reads the header only
+                size = self._sizes[path] = image.size
+        return size
+
+    @staticmethod
+    def target_size(fit: tuple[float, float], scale: float = 1.0) -> tuple[int, int]:
+        return max(int(fit[0] * scale), 1), max(int(fit[1] * scale), 1)
+
+    def get(self, path: str, box: tuple[int, int], scale: float = 1.0,
+            fast: bool = False) -> tuple[Image.Image, tuple[float, float]]:
+        """
+        the image of {path} fitted in {box} and its fitted (width, height) before {scale}.
+        {fast} scales a cached pyramid level with nearest neighbour and does not cache it, for interactive resizing
+        """
+        fit = fit_size(self.source_size(path), box)
+        key = (path, self.target_size(fit, scale))
+        with self._lock:
+            if (image := self._images.get(key)) is not None:
+                self._images.move_to_end(key)
+                return image, fit
+            future = self._pending.get(key)
+        if fast and (level := self.cached_level(path, key[1], any_level=True)) is not None:
+            return level.resize(key[1], Image.NEAREST), fit
+        # a failed prefetch is decoded again here, so its error is raised on the Tk thread
+        if future and future.exception() is None:
+            return future.result(), fit
+        return self._load(key), fit
+
+    def prefetch(self, paths: list[str], box: tuple[int, int], scale: float = 1.0):
+        """decode the existing {paths} in the background, nearest first"""
+        for path in paths:
+            self._pool.submit(self._prefetch, path, box, scale)
+
+    def _prefetch(self, path: str, box: tuple[int, int], scale: float):
+        if not os.path.exists(path):
+            return
+        key = (path, self.target_size(fit_size(self.source_size(path), box), scale))
+        with self._lock:
+            if key in self._images or key in self._pending:
+                return
+            future = self._pending[key] = Future()
+        try:
+            future.set_result(self._load(key))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _load(self, key: tuple) -> Image.Image:
+        path, size = key
+        return self._put(key, self.get_level(path, size).resize(size, Image.LANCZOS))
+
+    def cached_level(self, path: str, size: tuple[int, int], any_level: bool = False) -> Image.Image | None:
+        """the coarsest cached pyramid level of {path} at least {size}, with {any_level} a smaller one otherwise"""
+        level = pyramid_level(self.source_size(path), size)
+        levels = [*range(level, -1, -1), *(range(level + 1, PYRAMID_LEVELS) if any_level else ())]
+        with self._lock:
+            for cached in levels:
+                if (image := self._images.get((path, 'level', cached))) is not None:
+                    self._images.move_to_end((path, 'level', cached))
+                    return image
+        return None
+
+    def get_level(self, path: str, size: tuple[int, int]) -> Image.Image:
+        """the coarsest cached pyramid level of {path} at least {size}, decoded when none is cached"""
+        if (image := self.cached_level(path, size)) is not None:
+            return image
+        level = pyramid_level(self.source_size(path), size)
+        return self._put((path, 'level', level), decode_level(path, level))
+
+    def _put(self, key: tuple, image: Image.Image) -> Image.Image:
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = image
+                self._bytes += image_bytes(image)
+            self._images.move_to_end(key)
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, dropped = self._images.popitem(last=False)
+                self._bytes -= image_bytes(dropped)
+        return image
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,165 @@
+import importlib.util
+import logging
+import numpy as np
+
+BATCH_ELEMENTS = 1 << 22  # max padded iou cells computed by one batched call
+BACKENDS = ('python', 'numpy', 'torch')
+DEFAULT_BACKEND = 'numpy'
+
+_backend = DEFAULT_BACKEND
+
+logger = logging.getLogger(__name__)
+
+
+def set_backend(name: str = DEFAULT_BACKEND, threads: int | None = None) -> str:
+    """
+    select the iou backend used by batch_evaluate.
+    torch runs on cpu with {threads} intra-op threads, when torch/torchvision are not installed numpy is used
+    and torch is never imported.
+    :return: the backend actually in use
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"unknown iou backend {name!r}, expected one of {BACKENDS}")
+    if name == 'torch':
+        if importlib.util.find_spec('torch') is None or importlib.util.find_spec('torchvision') is None:
+            logger.warning("torch is not installed, using the numpy iou backend")
+            name = 'numpy'
+        else:
+            import BaseImage
+            BaseImage.load_torch(threads)
+    _backend = name
+    return _backend
+
+
+def get_backend() -> str:
+    return _backend
+
+
+def bboxes2pts(bboxes) -> np.ndarray:
+    """[x, y, w, h] bboxes to a (N, 4) array of [x1, y1, x2, y2] points"""
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1)
+
+
+def _iou(gt: np.ndarray, pred: np.ndarray) -> np.ndarray:
+    """(..., N, 4) gt and (..., M, 4) pred points to their (..., N, M) iou, same math as _python_iou"""
+    gt = gt[..., :, None, :]
+    pred = pred[..., None, :, :]
+    inter_w = np.maximum(np.minimum(gt[..., 2], pred[..., 2]) - np.maximum(gt[..., 0], pred[..., 0]), 0)
+    inter_h = np.maximum(np.minimum(gt[..., 3], pred[..., 3]) - np.maximum(gt[..., 1], pred[..., 1]), 0)
+    inter_area = inter_w * inter_h
+    gt_area = (gt[..., 2] - gt[..., 0]) * (gt[..., 3] - gt[..., 1])
+    pred_area = (pred[..., 2] - pred[..., 0]) * (pred[..., 3] - pred[..., 1])
+    union_area = gt_area + pred_area - inter_area
+    return np.divide(inter_area, union_area, out=np.zeros_like(inter_area), where=union_area != 0)
+
+
+def _python_iou(gt: np.ndarray, pred: np.ndarray, gt_lens: np.ndarray, pred_lens: np.ndarray) -> np.ndarray:
+    """reference backend, the original per pair iou loop over the real (not padded) boxes"""
+    iou = np.zeros(gt.shape[:2] + pred.shape[1:2])
+    for f, (n, m) in enumerate(zip(gt_lens.tolist(), pred_lens.tolist())):
+        for i, (x1_a, y1_a, x2_a, y2_a) in enumerate(gt[f, :n].tolist()):
+            for j, (x1_b, y1_b, x2_b, y2_b) in enumerate(pred[f, :m].tolist()):
+                inter_area = max(0, min(x2_a, x2_b) - max(x1_a, x1_b)) * max(0, min(y2_a, y2_b) - max(y1_a, y1_b))
+                union_area = (x2_b - x1_b) * (y2_b - y1_b) + (x2_a - x1_a) * (y2_a - y1_a) - inter_area
+                iou[f, i, j] = inter_area / union_area if union_area != 0 else 0
+    return iou
+
+
+def _numpy_iou(gt: np.ndarray, pred: np.ndarray, gt_lens: np.ndarray, pred_lens: np.ndarray) -> np.ndarray:
+    return _iou(gt, pred)
+
+
+def _torch_iou(gt: np.ndarray, pred: np.ndarray, gt_lens: np.ndarray, pred_lens: np.ndarray) -> np.ndarray:
+    """torchvision box_iou vectorized over the frames of the batch, on cpu"""
+    from BaseImage import torch, box_iou
+    with torch.no_grad():
+        iou = torch.func.vmap(box_iou)(torch.from_numpy(gt), torch.from_numpy(pred))
+    # box_iou divides by a zero union for padded / degenerated boxes, _python_iou returns 0 there
+    return torch.nan_to_num(iou, nan=0.0).numpy()
+
+
+_BACKENDS_IOU = {'python': _python_iou, 'numpy': _numpy_iou, 'torch': _torch_iou}
+
+
+def iou_matrix(gt: np.ndarray, pred: np.ndarray) -> np.ndarray:
+    """(N, 4) gt and (M, 4) pred points to their (N, M) iou matrix"""
+    return _iou(gt, pred)
+
+
+def get_hits(iou: np.ndarray, th: float) -> np.ndarray:
+    # a value below th is zeroed, so a zero iou is never a hit even when th is 0
+    return (iou >= th) & (iou > 0)
+
+
+def count_hits(iou: np.ndarray, th: float) -> tuple[int, int, int]:
+    """
+    tp: gt rows with at least one hit
+    fp: pred columns without any hit
+    fn: gt rows without any hit
+    """
+    hits = get_hits(iou, th)
+    tp = int(hits.any(axis=1).sum())
+    return tp, int(iou.shape[1] - hits.any(axis=0).sum()), int(iou.shape[0] - tp)
+
+
+def evaluate(gt: np.ndarray, pred: np.ndarray, th: float) -> tuple[np.ndarray, tuple[int, int, int]]:
+    """iou matrix and (tp, fp, fn) of one frame"""
+    iou = iou_matrix(gt, pred)
+    return iou, count_hits(iou, th)
+
+
+def _batches(gt_lens: np.ndarray, pred_lens: np.ndarray, max_elements: int):
+    """consecutive [start, end) frames ranges whose padded iou fits in max_elements cells"""
+    start, n, m = 0, 0, 0
+    for i in range(len(gt_lens)):
+        new_n, new_m = max(n, gt_lens[i]), max(m, pred_lens[i])
+        if i > start and (i + 1 - start) * new_n * new_m > max_elements:
+            yield start, i
+            start, new_n, new_m = i, gt_lens[i], pred_lens[i]
+        n, m = new_n, new_m
+    if start < len(gt_lens):
+        yield start, len(gt_lens)
+
+
+def _pad(boxes: list[np.ndarray], lens: np.ndarray) -> np.ndarray:
+    """stack the frames boxes into a zero padded (F, max_len, 4) array"""
+    padded = np.zeros((len(boxes), lens.max(initial=0), 4))
+    if lens.sum():
+        frame_ids = np.repeat(np.arange(len(boxes)), lens)
+        positions = np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+        padded[frame_ids, positions] = np.concatenate(boxes)
+    return padded
+
+
+def _unpad(values: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """the real (not padded) values of a (F, max_len) array, concatenated frame after frame"""
+    return values[np.arange(values.shape[1]) < lens[:, None]]
+
+
+def batch_evaluate(gts: list[np.ndarray], preds: list[np.ndarray], th: float,
+                   max_elements: int = BATCH_ELEMENTS) -> tuple[list[np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    evaluate many frames (a whole scene) at once with the selected backend.
+    the frames are padded into (F, N, 4) and (F, M, 4) batches, padded boxes have no area so they never hit.
+    :return: the per frame iou matrices, a (F, 3) array of tp, fp, fn per frame,
+             and the best iou of every gt box (row max) and of every pred box (column max) of all the frames,
+             a box is a hit at any threshold th when its best iou is >= th, see sweep.sweep_counts
+    """
+    gt_lens = np.array([len(gt) for gt in gts], dtype=np.int64)
+    pred_lens = np.array([len(pred) for pred in preds], dtype=np.int64)
+    matrices = []
+    counts = np.zeros((len(gts), 3), dtype=np.int64)
+    gt_best, pred_best = [np.zeros(0)], [np.zeros(0)]
+    for start, end in _batches(gt_lens, pred_lens, max_elements):
+        n, m = gt_lens[start:end], pred_lens[start:end]
+        iou = _BACKENDS_IOU[_backend](_pad(gts[start:end], n), _pad(preds[start:end], m), n, m)
+        hits = get_hits(iou, th)
+        tp = hits.any(axis=2).sum(axis=1)
+        counts[start:end] = np.stack([tp, m - hits.any(axis=1).sum(axis=1), n - tp], axis=1)
+        matrices += [iou[i, :n[i], :m[i]].copy() for i in range(end - start)]
+        # padded cells are 0, they never raise a max
+        gt_best.append(_unpad(iou.max(axis=2, initial=0), n))
+        pred_best.append(_unpad(iou.max(axis=1, initial=0), m))
+    return matrices, counts, np.concatenate(gt_best), np.concatenate(pred_best)
@@ -0,0 +1,129 @@
+import operator
+import re
+import numpy as np
+
+METRICS_COLUMNS = ['GT', 'PREDICT', 'TP', 'FP', 'FN', 'RECALL', 'PRECISION', 'F1_SCORE']
+FILTER_OPERATORS = {'>=': operator.ge, '<=': operator.le, '!=': operator.ne, '==': operator.eq, '=': operator.eq,
+                    '>': operator.gt, '<': operator.lt}
+FILTER_TERM = re.compile(r'^(\w+)(>=|<=|!=|==|=|>|<)(-?\d+(?:\.\d*)?)$')
+
+
+def ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a / b rounded like helpers.get_recall / get_precision, 0 where b is 0"""
+    return np.round(np.divide(a, b, out=np.zeros(len(a)), where=b != 0), 2)
+
+
+def metrics(counts) -> dict[str, np.ndarray]:
+    """the METRICS_COLUMNS columns of the (N, 5) gt, pred, tp, fp, fn counts"""
+    gt, pred, tp, fp, fn = np.asarray(counts, dtype=np.int64).reshape(-1, 5).T
+    recall, precision = ratio(tp, tp + fn), ratio(tp, tp + fp)
+    f1_score = ratio(2 * recall * precision, recall + precision)
+    return dict(zip(METRICS_COLUMNS, (gt, pred, tp, fp, fn, recall, precision, f1_score)))
+
+
+def scene_frames(scene_index: int, child) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """the names ('scene/frame'), (F, 2) locations and (F, 5) counts of the frames rows of a scene"""
+    if not child.images:
+        return [], np.zeros((0, 2), dtype=np.int64), np.zeros((0, 5), dtype=np.int64)
+    buffer = child.buffer
+    return ([f"{child.name}/{image.name}" for image in child.images],
+            np.stack([np.full(len(buffer), scene_index), np.arange(len(buffer))], axis=1),
+            np.column_stack([buffer.gt_lens, buffer.pred_lens, buffer.counts]))
+
+
+class MetricsRows:
+    """
+    the metrics of the scenes or of the frames of a loader as columns, one array per METRICS_COLUMNS column.
+    sorting and filtering only compute the {view} array of the rows indexes to show, the columns never move
+    """
+    def __init__(self, names: list[str], locations: np.ndarray, counts: np.ndarray):
+        """
+        :param locations: (N, 2) scene index, frame index (-1 for a scene row) of every row, sorted by scene
+        :param counts: (N, 5) gt, pred, tp, fp, fn of every row
+        """
+        self.names = np.asarray(names, dtype=str)
+        self.locations = locations
+        self.columns = metrics(counts)
+        self.order = np.arange(len(self.names))
+        self.mask = np.ones(len(self.names), dtype=bool)
+        self.view = self.order
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def scenes(cls, loader) -> 'MetricsRows':
+        counts = [child.get_info()[1:6] for child in loader.children]
+        locations = np.stack([np.arange(len(counts)), np.full(len(counts), -1)], axis=1)
+        return cls([child.name for child in loader.children], locations, counts)
+
+    @classmethod
+    def frames(cls, loader) -> 'MetricsRows':
+        """the frames of all the scenes, a row name is 'scene/frame'"""
+        names, locations, counts = [], [np.zeros((0, 2), dtype=np.int64)], [np.zeros((0, 5), dtype=np.int64)]
+        for i, child in enumerate(loader.children):
+            scene_names, scene_locations, scene_counts = scene_frames(i, child)
+            names += scene_names
+            locations.append(scene_locations)
+            counts.append(scene_counts)
+        return cls(names, np.concatenate(locations), np.concatenate(counts))
+
+    def update_scene(self, scene_index: int, child):
+        """
+        the rows of a scene built after the rows (lazy mode): the counts of its scene row are replaced,
+        or its frames rows are replaced by the frames of {child}. the view is reset, sort and filter again after it
+        """
+        start, end = np.searchsorted(self.locations[:, 0], [scene_index, scene_index + 1]).tolist()
+        if end - start == 1 and self.locations[start, 1] < 0:
+            for column, values in metrics(child.get_info()[1:6]).items():
+                self.columns[column][start] = values[0]
+        else:
+            names, locations, counts = scene_frames(scene_index, child)
+            self.names = np.concatenate([self.names[:start], np.asarray(names, dtype=str), self.names[end:]])
+            self.locations = np.concatenate([self.locations[:start], locations, self.locations[end:]])
+            self.columns = {column: np.concatenate([self.columns[column][:start], values, self.columns[column][end:]])
+                            for column, values in metrics(counts).items()}
+        self.order = np.arange(len(self.names))
+        self.mask = np.ones(len(self.names), dtype=bool)
+        self.update_view()
+
+    def sort(self, column: str, descending: bool = False):
+        """sort by a METRICS_COLUMNS column or by 'name', equal rows keep their order"""
+        key = self.names if column == 'name' else self.columns[column]
+        self.order = np.argsort(key, kind='stable')
+        if descending:
+            self.order = self.order[::-1]
+        self.update_view()
+
+    def filter(self, text: str):
+        """
+        keep the rows matching all the space separated terms of {text}: 'COLUMN<op>value' compares a column
+        (op is one of >=, <=, !=, ==, =, >, <, e.g. 'FN>0 F1_SCORE<0.5'), any other term is a part of the row name
+        """
+        mask = np.ones(len(self.names), dtype=bool)
+        for term in text.split():
+            match = FILTER_TERM.match(term)
+            if match and match[1].upper() in self.columns:
+                column, op, value = match[1].upper(), FILTER_OPERATORS[match[2]], float(match[3])
+                mask &= op(self.columns[column], value)
+            else:
+                mask &= np.char.find(self.names, term) >= 0
+        self.mask = mask
+        self.update_view()
+
+    def update_view(self):
+        self.view = self.order[self.mask[self.order]]
+
+    def row(self, position: int) -> tuple:
+        """the displayed values of the row at {position} of the view"""
+        i = self.view[position]
+        return str(self.names[i]), *(self.columns[column][i].item() for column in METRICS_COLUMNS)
+
+    def location(self, position: int) -> tuple[int, int]:
+        scene_index, frame_index = self.locations[self.view[position]].tolist()
+        return scene_index, frame_index
+
+    def position(self, location: tuple[int, int]) -> int | None:
+        """the view position of the row at {location}, None when the row is filtered out or missing"""
+        found = np.flatnonzero((self.locations[self.view] == location).all(axis=1))
+        return int(found[0]) if len(found) else None
@@ -1,65 +1,225 @@
 import argparse
+import hashlib
+import itertools
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+import numpy as np
 from helpers import *
 from BaseLoader import BaseLoader
+from BaseImage import BaseImage, SceneBuffer
+from cache import BoxCache, arrays_hash, file_hash, frames_to_arrays, load_frames, load_frames_groups
+from iou import BACKENDS, DEFAULT_BACKEND, get_hits, set_backend
+from profiler import profile_run, profiled, profiled_iter
+from sweep import (GRID_FIELDS_NAMES, SWEEP_FIELDS_NAMES, format_grid, format_sweep, grid_rows, parse_thresholds,
+                   sweep_counts, sweep_rows)
 
 
 CRITERIA_FLAG = True
 IOA = 'ioa'
-FIELDS_NAMES = ['rgb_name', 'thermal_name', 'GT', 'PREDICT', 'FN', 'FP', 'TP']
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+FIELDS_NAMES = ['scene_name', 'file_name', 'GT', 'PREDICT', 'FN', 'FP', 'TP']
+
+logger = logging.getLogger(__name__)
 
 
 class OgiLoader(BaseLoader):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.gt_frames: dict[str, list[dict]] = {}  # see load_gt_frames
+
+    @profiled('build')
     def build(self, ):
         gt_scenes = self.load_scenes_dir()
-        pred_data = self.get_pred_data()
+        self.gt_frames = self.load_gt_frames(gt_scenes)
+        pred_data = self.iter_pred_data()
         self.children = self.build_scenes(gt_scenes, pred_data)
         self.children_count = len(self.children)
 
+    def build_lazy(self):
+        """
+        lazy mode: list the gt scenes right away as PendingScene children without reading the predictions,
+        a SceneBuilder builds them in the background
+        """
+        self.children = [PendingScene(name, self.th) for name in sorted(self.load_scenes_dir())]
+        self.children_count = len(self.children)
+
+    def load_gt_frames(self, scenes) -> dict[str, list[dict]]:
+        """
+        with a cache, the extracted gt frames of all the {scenes} keyed by their coco path, cached as one entry of
+        the gt directory (shared by the loaders of the gt memo). without a cache every scene reads its own coco
+        """
+        if not self.cache:
+            return {}
+        paths = sorted(filter(None, map(self.get_coco_path, scenes)))
+        return self.shared_gt(self.gt, lambda: dict(zip(paths, load_frames_groups(self.cache, paths, 'ogi_gt_dir',
+                                                                                  Ogi.load_gt_data))))
+
+    def scene_gt(self, gt_path) -> list[dict]:
+        """the extracted gt frames of a scene coco, from the gt directory cache entry when it was loaded"""
+        if gt_path in self.gt_frames:
+            return self.gt_frames[gt_path]
+        return self.shared_gt(gt_path, lambda: Ogi.load_gt_data(gt_path, self.cache))
+
+    def get_coco_path(self, scene_name):
+        for file_name in os.listdir(str(os.path.join(self.gt, scene_name))):
+            if os.path.splitext(file_name)[-1] in ('.json', '.JSON'):
+                return os.path.join(self.gt, scene_name, file_name)
+
     def build_scenes(self, gt_scenes, pred_data):
-        def get_coco_path(scene_name):
-            for file_name in os.listdir(str(os.path.join(self.gt, scene_name))):
-                if os.path.splitext(file_name)[-1] in ('.json', '.JSON'):
-                    return os.path.join(self.gt, scene_name, file_name)
-
-        scenes_names = sorted(list(set(gt_scenes).intersection(set(pred_data.keys()))))
-        return [Ogi(
-            name=scene_name,
-            gt_path=get_coco_path(scene_name),
-            pred_data=pred_data[scene_name],
-            th=self.th
-        ) for scene_name in scenes_names]
+        """
+        evaluate the (scene_name, pred_data) scenes as they are streamed, skipping scenes without a gt folder.
+        a scene name seen twice keeps its last pred data, the children are sorted by scene name.
+        """
+        gt_scenes = set(gt_scenes)
+        scenes = ((name, self.get_coco_path(name), data) for name, data in pred_data if name in gt_scenes)
+        reused, fingerprints = {}, {}
+        if self.results:
+            scenes = self.changed_scenes(scenes, reused, fingerprints)
+        if self.workers:
+            children = self.evaluate_scenes(scenes)
+        elif self.results:
+            children = {name: evaluate_scene(name, gt_path, data, self.th, self.cache,
+                                             self.gt_frames.get(gt_path))
+                        for name, gt_path, data in scenes}
+        else:
+            children = {name: Ogi(name=name, gt_path=gt_path, pred_data=data, th=self.th, cache=self.cache,
+                                  gt_list=self.scene_gt(gt_path))
+                        for name, gt_path, data in scenes}
+        if self.results:
+            for name, result in children.items():
+                if name not in reused:
+                    self.results.store(name, fingerprints[name], result.to_arrays())
+            logger.info("incremental: %d scenes reused, %d evaluated", len(reused),
+                        len(children.keys() - reused.keys()))
+            children.update(reused)
+        return [children[name] for name in sorted(children)]
+
+    def changed_scenes(self, scenes, reused: dict, fingerprints: dict):
+        """
+        incremental mode, pass on the (name, gt_path, pred_data) scenes whose gt file, pred frames or th changed
+        since their stored result, the stored results of the unchanged scenes are collected into {reused}
+        """
+        for name, gt_path, data in scenes:
+            fingerprint = scene_fingerprint(gt_path, data, self.th)
+            if (arrays := self.results.load(name, fingerprint)) is not None:
+                reused[name] = OgiResult.from_arrays(arrays)
+                continue
+            reused.pop(name, None)
+            fingerprints[name] = fingerprint
+            yield name, gt_path, data
+
+    def evaluate_scenes(self, scenes) -> dict[str, 'OgiResult']:
+        """
+        evaluate the streamed (name, gt_path, pred_data) scenes in {self.workers} processes.
+        every worker sends back a compact OgiResult, at most 2 scenes per worker are in flight so the pred data
+        of the scenes still to come is not held in memory.
+        """
+        results = {}
+        pending = deque()
+        with ProcessPoolExecutor(self.workers, initializer=set_backend, initargs=(self.backend, self.threads)) as pool:
+            for name, gt_path, data in scenes:
+                pending.append(pool.submit(evaluate_scene, name, gt_path, data, self.th, self.cache,
+                                           self.gt_frames.get(gt_path)))
+                if len(pending) >= 2 * self.workers:
+                    result = pending.popleft().result()
+                    results[result.name] = result
+            for future in pending:
+                result = future.result()
+                results[result.name] = result
+        return results
 
     def load_scenes_dir(self):
         """load all scene paths to a list"""
         return [folder for folder in os.listdir(self.gt) if os.path.isdir(os.path.join(self.gt, folder))]
 
-    def get_pred_data(self):
-        pred_scenes_data = read_json(self.pred)
-        return {re_scene_name(name): data for name, data in pred_scenes_data['scenes'].items()}
-
-    def collect_children_data(self):
+    def iter_pred_data(self):
+        """
+        stream the predictions file one (scene_name, pred_frames) at a time instead of loading it whole.
+        with a cache every extracted scene is written as it is streamed, the entry is committed once the file is
+        fully read and streamed from there next time.
+        """
+        read = 0
+        if self.cache and (groups := self.cache.load_groups(self.pred, 'ogi_pred')) is not None:
+            try:
+                for name, frames in groups:
+                    yield name, frames
+                    read += 1
+                return
+            except FileNotFoundError:  # evicted while streamed, the remaining scenes are read from the file
+                logger.info("the cached %s was evicted, reading it from scene %d", self.pred, read)
+        writer = self.cache.groups_writer(self.pred, 'ogi_pred') if self.cache and not read else None
+        try:
+            items = itertools.islice(iter_json_items(self.pred, 'scenes'), read, None)
+            for name, data in profiled_iter(items, 'read_json'):
+                scene_name, pred_frames = re_scene_name(name), extract_pred_coco(data)
+                if writer:
+                    writer.add(scene_name, pred_frames)
+                yield scene_name, pred_frames
+            if writer:
+                writer.commit()
+        finally:
+            if writer:
+                writer.close()
+
+    def child_totals(self, child):
         """
         ogi guidelines:
             if {self.d_th} of the frames in a scene is tp all the scene, We define a Hit,tp!
             else there is no tp for scene:
                 if tp was found less than d_th, We define a Miss,fn!
                 else if there is no gt annotation but there is pred annotation for all scene add 1 to global fp
-        :return:
+        :return: the scene (gt_count, pred_count, hit, false, miss)
+        """
+        if isinstance(child, PendingScene):
+            return 0, 0, 0, 0, 0
+        images_count, gt_count, pred_count, tp, fp, fn, th = child.get_info()
+        hit = get_precision(tp, gt_count) >= self.d_th
+        false = get_precision(fp, images_count) >= self.d_th
+        return gt_count or 0, pred_count or 0, int(hit), int(false), int(not hit)
+
+    def set_d_threshold(self, d_th: float):
+        """the scene decisions change but not the scenes evaluation, every scene is re-decided"""
+        self.d_th = d_th
+        self.mark_dirty()
+
+    def scene_ratios(self, thresholds) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (S, T) hit ratio get_precision(tp, gt_count) and false alarm ratio get_precision(fp, images_count)
+        of every scene at every iou threshold, the scene decisions of any d_th are comparisons with them
         """
-        self.gt_count = self.pred_count = 0
-        for child in self.children:
-            images_count, gt_count, pred_count, tp, fp, fn, th = child.get_info()
-            # print(f"{child.name} has: {images_count} frames")
-            self.gt_count += gt_count if gt_count else 0
-            self.pred_count += pred_count if pred_count else 0
-            if get_precision(tp, gt_count) >= self.d_th:
-                self.tp += 1
-            else:
-                self.fn += 1
-            if get_precision(fp, images_count) >= self.d_th:
-                self.fp += 1
-            self.th = th
-        return self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
+        hit = np.zeros((len(self.children), len(thresholds)))
+        false = np.zeros_like(hit)
+        for s, child in enumerate(self.children):
+            images_count, gt_count, *_ = child.get_info()
+            for t, (tp, fp, _) in enumerate(child.sweep(thresholds).tolist()):
+                hit[s, t], false[s, t] = get_precision(tp, gt_count), get_precision(fp, images_count)
+        return hit, false
+
+    @profiled('aggregate')
+    def decision_counts(self, thresholds, d_thresholds) -> np.ndarray:
+        """
+        (T, D, 3) scenes tp (hit), fp (false alarm) and fn (miss) of every iou threshold and d_th,
+        the decisions of collect_children_data for the whole grid in one pass
+        """
+        hit, false = self.scene_ratios(thresholds)
+        d_thresholds = np.asarray(d_thresholds)
+        hits = (hit[..., None] >= d_thresholds).sum(axis=0)
+        return np.stack([hits, (false[..., None] >= d_thresholds).sum(axis=0), len(self.children) - hits], axis=-1)
+
+    def sweep(self, thresholds) -> list[dict]:
+        """the summary at every iou threshold from the iou computed once, the scenes are decided with {self.d_th}"""
+        gt_count = sum(child.gt_count for child in self.children)
+        pred_count = sum(child.pred_count for child in self.children)
+        counts = self.decision_counts(thresholds, [self.d_th])[:, 0]
+        return sweep_rows(self.model, thresholds, gt_count, pred_count, counts)
+
+    def decision_grid(self, thresholds, d_thresholds) -> list[dict]:
+        """the summary of every (th, d_th) pair, one row per pair"""
+        return grid_rows(thresholds, d_thresholds, self.decision_counts(thresholds, d_thresholds))
 
     def gui_export(self):
         frames = ['scene_name', 'frame_name', 'gt', 'pred', 'git', 'false', 'miss', 'recall', 'precision', 'f1']
@@ -86,20 +246,26 @@ class OgiLoader(BaseLoader):
 
 
 class Ogi:
-    def __init__(self, name, gt_path, pred_data, th):
+    def __init__(self, name, gt_path, pred_data, th, cache: BoxCache | None = None, gt_list: list | None = None):
+        """
+        :param pred_data: the extracted pred frames of the scene (see helpers.extract_pred_coco)
+        :param gt_list: the already extracted gt frames of {gt_path}, they are only read
+        """
         self.name = name
-        print(self.name)
-        self.gt_list = self.load_gt_data(gt_path)
-        self.pred_list = extract_coco(pred_data, self.get_pred_bboxes)
-        # fill the below with process_data method
-        self.names_list = self.get_images_names()
-        self.images_count = len(self.names_list)
+        logger.debug(self.name)
+        if gt_list is None:
+            gt_list = self.load_gt_data(gt_path, cache)
+        frames = join_frames(index_frames(gt_list, 'file_name'), index_frames(pred_data, 'file_name'))
         self.gt_count = 0
         self.pred_count = 0
-        self.annotations = self.build_annotations()
+        # the raw gt/pred records are dropped once the scene buffer holds their boxes
+        annotations = self.build_annotations(frames)
+        self.names_list = [ann['thermal_name'] for ann in annotations]
+        self.images_count = len(self.names_list)
         self.th = th
         self.tp = self.fp = self.fn = 0
-        self.images: list[OgiImage] = self.create_images()
+        self.buffer = SceneBuffer(annotations)
+        self.images: list[OgiImage] = self.create_images(annotations)
 
     def load_pred_data(self, path):
         if os.path.split(path)[1].lower() == 'csv':
@@ -118,57 +284,69 @@ class Ogi:
             'bboxes': d['bboxes']
         } for d in data]
 
-    def load_gt_data(self, paths):
-        if type(paths) is str:  # verify if paths is only one path, to be in a list.
-            paths = [paths]
-        cocos = read_jsons(paths)
-        return extract_cocos(cocos, self.get_gt_bboxes)
-
-    def extract_cocos(self, cocos, bboxes_callback):
-        return [{
-            'file_name': image['file_name'],
-            'width': image['width'],
-            'height': image['height'],
-            'bboxes': bboxes_callback(coco, image)
-        } for coco in cocos for image in coco['images']]
-
-    def get_gt_bboxes(self, coco, image):
-        return [a['bbox'] for a in coco['annotations'] if a['image_id'] == image['id']]
-
-    def get_pred_bboxes(self, coco, image):
-        return [[a['bbox'], a['confidence']]for a in coco['annotations'] if a['image_id'] == image['id']]
-
-    def get_images_names(self, ):
-        set1 = {pred_ann['file_name'] for pred_ann in self.pred_list}
-        set2 = {gt_ann['file_name'] for gt_ann in self.gt_list}
-        return sorted(list(set1.intersection(set2)))
+    @staticmethod
+    def load_gt_data(path, cache: BoxCache | None = None):
+        return load_frames(cache, path, 'ogi_gt', lambda p: extract_coco(read_json(p), get_gt_bboxes))
 
     def get_info(self):
         return self.images_count, self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
 
-    def create_images(self):
-        images = [OgiImage(self, data) for data in self.annotations]
-        images.sort(key=lambda x: x.name)
-        return images
+    def summary(self) -> 'OgiResult':
+        frames = tuple((image.name, *image.get_info()) for image in self.images)
+        buffer = self.buffer
+        with_gt = np.repeat(buffer.gt_lens > 0, buffer.pred_lens)
+        # the frames with pred, every segment between their starts is a single frame
+        with_pred = buffer.pred_lens > 0
+        frames_confidence = (np.maximum.reduceat(buffer.confidences, buffer.pred_offsets[:-1][with_pred])
+                             if with_pred.any() else np.zeros(0))
+        return OgiResult(self.name, *self.get_info(), frames=frames, gt_best=buffer.gt_best,
+                         pred_best=buffer.pred_best[with_gt], gt_confidence=buffer.gt_confidence,
+                         pred_confidence=buffer.confidences[with_gt].astype(np.float64),
+                         no_gt_confidence=frames_confidence[buffer.gt_lens[with_pred] == 0].astype(np.float64))
+
+    def sweep(self, thresholds) -> np.ndarray:
+        """(T, 3) tp, fp, fn of the scene at every threshold"""
+        return self.summary().sweep(thresholds)
+
+    def curve_inputs(self):
+        return self.summary().curve_inputs()
+
+    def set_threshold(self, th: float):
+        self.th = th
+        self.evaluate_images()
 
-    def build_annotations(self):
+    def create_images(self, annotations):
+        self.evaluate_images()
+        return [OgiImage(self, i, data) for i, data in enumerate(annotations)]
+
+    def evaluate_images(self):
+        """check the collisions of all the scene frames in padded batches instead of frame by frame"""
+        counts = self.buffer.evaluate(self.th)
+        # a frame with pred but no gt annotation is a single false alarm
+        no_gt = self.buffer.gt_lens == 0
+        counts[no_gt, 1] = self.buffer.pred_lens[no_gt] > 0
+        self.tp, self.fp, self.fn = counts.sum(axis=0).tolist()
+
+    def build_annotations(self, frames):
+        """
+        merge the joined frames into one record per frame sorted by name,
+        the last pred record of a frame wins and all of its gt bboxes are kept
+        """
         annotations = []
-        for file_name in self.names_list:
-            new_ann = {'thermal_name': file_name, 'gt_bboxes': []}
-            for pred_ann in self.pred_list:
-                if file_name == pred_ann['file_name']:
-                    new_ann.update({
-                        'width': pred_ann['width'],
-                        'height': pred_ann['height'],
-                        'pred_bboxes': pred_ann['bboxes']
-                    })
-                    self.pred_count += len(pred_ann['bboxes'])
-            for gt_ann in self.gt_list:
-                if file_name == gt_ann['file_name']:
-                    new_ann['gt_bboxes'] += (gt_ann['bboxes'])
-                    self.gt_count += len(gt_ann['bboxes'])
+        for _, gt_frames, pred_frames in frames:
+            pred_ann = pred_frames[-1]
+            new_ann = {
+                'thermal_name': gt_frames[0]['file_name'],
+                'width': pred_ann['width'],
+                'height': pred_ann['height'],
+                'pred_bboxes': pred_ann['bboxes'],
+                'confidence': pred_ann['confidence'],
+                'gt_bboxes': [bbox for gt_ann in gt_frames for bbox in gt_ann['bboxes']]
+            }
+            self.pred_count += len(new_ann['pred_bboxes'])
+            self.gt_count += len(new_ann['gt_bboxes'])
             annotations.append(new_ann)
-        # print('\n', self.name, '\n', annotations)
+        annotations.sort(key=lambda ann: ann['thermal_name'])
         return annotations
 
     def get_image_index(self, file_name: str) -> int:
@@ -211,20 +389,176 @@ class Ogi:
                 }
 
 
-class OgiImage:
-    def __init__(self, manager, data):
-        self.manager: Ogi = manager
-        self.name = data['thermal_name']
-        self.width = data['width']
-        self.height = data['height']
-        self.pred, self.confidence = self.get_bboxes_and_confidence_from_pred(data['pred_bboxes'])
-        print(self.name)
-        print(f"{self.pred}: {self.confidence=}")
-        self.gt = self.normalize_bboxes(data['gt_bboxes'])
-        self.metric = []
-        self.tp = self.fp = self.fn = 0
-        self.check_collisions()
-        self.count_metrics()
+class OgiResult(NamedTuple):
+    """compact picklable evaluation of an Ogi scene, returned by the worker processes instead of the Ogi object"""
+    name: str
+    images_count: int
+    gt_count: int
+    pred_count: int
+    tp: int
+    fp: int
+    fn: int
+    th: float
+    frames: tuple[tuple, ...]  # (file_name, GT, PREDICT, TP, FP, FN) per frame
+    gt_best: np.ndarray  # best iou of every gt box
+    pred_best: np.ndarray  # best iou of every pred box of the frames with gt
+    gt_confidence: np.ndarray  # highest confidence of the preds hitting every gt box
+    pred_confidence: np.ndarray  # confidence of every pred box of the frames with gt
+    no_gt_confidence: np.ndarray  # highest pred confidence of every frame with pred but no gt
+
+    def get_info(self):
+        return self.images_count, self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
+
+    def sweep(self, thresholds) -> np.ndarray:
+        """(T, 3) tp, fp, fn of the scene at every threshold, a frame with pred but no gt stays a single fp"""
+        counts = sweep_counts(self.gt_best, self.pred_best, thresholds)
+        counts[:, 1] += sum(1 for _, gt, pred, *_ in self.frames if not gt and pred)
+        return counts
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """the result as plain arrays, see cache.ResultStore"""
+        names, *counts = zip(*self.frames) if self.frames else ((), ())
+        return {'name': np.asarray(self.name), 'info': np.asarray(self.get_info()[:-1], dtype=np.int64),
+                'th': np.asarray(self.th), 'frames_names': np.asarray(names, dtype=str),
+                'frames_counts': np.asarray(counts, dtype=np.int64).T.reshape(-1, 5),
+                'gt_best': self.gt_best, 'pred_best': self.pred_best, 'gt_confidence': self.gt_confidence,
+                'pred_confidence': self.pred_confidence, 'no_gt_confidence': self.no_gt_confidence}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> 'OgiResult':
+        frames = tuple((name, *counts) for name, counts in zip(arrays['frames_names'].tolist(),
+                                                               arrays['frames_counts'].tolist()))
+        return cls(str(arrays['name']), *arrays['info'].tolist(), float(arrays['th']), frames=frames,
+                   gt_best=arrays['gt_best'], pred_best=arrays['pred_best'], gt_confidence=arrays['gt_confidence'],
+                   pred_confidence=arrays['pred_confidence'], no_gt_confidence=arrays['no_gt_confidence'])
+
+    def set_threshold(self, th: float):
+        raise TypeError(f"{self.name} was evaluated in a worker process, rebuild the loader to change its threshold")
+
+    def curve_inputs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (gt_confidence, confidence, hits) of curves.pr_curve, a frame with pred but no gt is a single fp
+        at its highest confidence
+        """
+        hits = get_hits(self.pred_best, self.th)
+        return (self.gt_confidence, np.concatenate([self.pred_confidence, self.no_gt_confidence]),
+                np.concatenate([hits, np.zeros(len(self.no_gt_confidence), dtype=bool)]))
+
+    def get_data(self):
+        keys = ('file_name', 'GT', 'PREDICT', 'TP', 'FP', 'FN')
+        return [{'scene_name': self.name, **dict(zip(keys, frame))} for frame in self.frames]
+
+
+def scene_fingerprint(gt_path, pred_data, th) -> str:
+    """fingerprint of a scene evaluation inputs: its gt file content, its pred frames and the iou threshold"""
+    key = '|'.join((file_hash(gt_path), arrays_hash(frames_to_arrays(pred_data)), repr(th)))
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def evaluate_scene(name, gt_path, pred_data, th, cache=None, gt_list=None) -> OgiResult:
+    """process pool entry point, build the scene and keep only its compact result"""
+    return Ogi(name=name, gt_path=gt_path, pred_data=pred_data, th=th, cache=cache, gt_list=gt_list).summary()
+
+
+class PendingScene:
+    """a scene of the lazy mode not built yet, an empty scene until the SceneBuilder replaces it"""
+    images_count = gt_count = pred_count = tp = fp = fn = 0
+
+    def __init__(self, name, th):
+        self.name = name
+        self.th = th
+        self.status = 'loading'  # 'no predictions' once the predictions file was read without this scene
+        self.images = []
+        self.names_list = []
+
+    def get_info(self):
+        return self.images_count, self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
+
+    def get_analysis(self):
+        return 0, 0, 0, self.th
+
+    def set_threshold(self, th: float):
+        self.th = th
+
+    def get_image_index(self, file_name: str) -> int | None:
+        logger.warning("scene %s not built yet (%s), no frame %s", self.name, self.status, file_name)
+        return None
+
+    def get_data(self):
+        return []
+
+    def export_data(self, file_name: str):
+        logger.warning("scene %s not built yet (%s), nothing exported to %s", self.name, self.status, file_name)
+
+
+class SceneBuilder(threading.Thread):
+    """
+    lazy mode background worker: stream the predictions file and build the PendingScene children of {loader}
+    in stream order, a requested scene is built before the others as soon as it is read.
+    the (index, Ogi) built are put on {self.built} ((index, None) for a scene without predictions), the Tk thread
+    swaps them into the loader (see Viewer.poll_scenes), the loader children are never touched from this thread
+    """
+    def __init__(self, loader: OgiLoader):
+        super().__init__(name='scene-builder', daemon=True)
+        self.loader = loader
+        self.names = [child.name for child in loader.children]
+        self.indexes = {name: i for i, name in enumerate(self.names)}
+        self.built = queue.Queue()
+        self._requests = queue.Queue()
+        self._done = set()
+        self.gt_frames: dict[str, list[dict]] = {}  # loaded by the thread, see OgiLoader.load_gt_frames
+
+    def request(self, index: int):
+        """build the scene {index} next, called from the Tk thread"""
+        self._requests.put(index)
+
+    def _wanted(self, wanted: int | None) -> int | None:
+        while not self._requests.empty():
+            wanted = self._requests.get_nowait()
+        return None if wanted in self._done else wanted
+
+    def _build(self, index: int, pred_data):
+        name = self.names[index]
+        try:
+            gt_path = self.loader.get_coco_path(name)
+            scene = Ogi(name=name, gt_path=gt_path, pred_data=pred_data, th=self.loader.th, cache=self.loader.cache,
+                        gt_list=self.gt_frames.get(gt_path))
+        except Exception:
+            logger.exception("failed to build the scene %s", name)
+            scene = None
+        self._done.add(index)
+        self.built.put((index, scene))
+
+    def run(self):
+        self.gt_frames = self.loader.load_gt_frames(self.names)
+        read = {}  # pred data of the scenes read and not built yet
+        stream = ((self.indexes[name], data) for name, data in self.loader.iter_pred_data() if name in self.indexes)
+        wanted = None
+        while True:
+            wanted = self._wanted(wanted)
+            if wanted in read or (wanted is None and read):
+                index = wanted if wanted is not None else next(iter(read))
+                self._build(index, read.pop(index))
+                continue
+            if (item := next(stream, None)) is None:
+                break
+            index, data = item
+            # a scene read twice keeps its last pred data, like build_scenes
+            self._done.discard(index)
+            read[index] = data
+        for index in read:
+            self._build(index, read[index])
+        for index in set(range(len(self.names))) - self._done:
+            self.built.put((index, None))
+
+
+class OgiImage(BaseImage):
+    __slots__ = ()
+
+    def __init__(self, manager, index, data):
+        super().__init__(manager, index, data)
+        self.manager: Ogi
+        logger.debug("%s\n%s: confidence=%s", self.name, self.pred, self.confidence)
 
     def export_data(self):
         return {
@@ -237,72 +571,6 @@ class OgiImage:
             'FN': self.fn
         }
 
-    def get_info(self):
-        return len(self.gt), len(self.pred), self.tp, self.fp, self.fn
-
-    def normalize_bboxes(self, bboxes):
-        return [self.normalize_bbox(bbox, self.width, self.height) for bbox in bboxes]
-
-    @staticmethod
-    def normalize_bbox(bbox, width, height):
-        x, y, w, h = bbox
-        return [x / width, y / height, w / width, h / height]
-
-    def count_metrics(self):
-        for row in self.metric:
-            self.tp += 1 if sum(row) else 0
-            self.manager.tp += 1 if sum(row) else 0
-            if sum(row) == 0:
-                self.fn += 1
-                self.manager.fn += 1
-        # Count False Positives (FP)
-        if self.gt:
-            for col_idx in range(len(self.metric[0])):
-                column_sum = sum([self.metric[row_idx][col_idx] for row_idx in range(len(self.metric))])
-                self.fp += 0 if column_sum else 1
-                self.manager.fp += 0 if column_sum else 1
-        elif self.pred:
-            self.fp += 1
-            self.manager.fp += 1
-
-    def check_collisions(self):
-        for gt_bbox in self.gt:
-            gt_bbox = OgiImage.bbox2pt(gt_bbox)
-
-            row = [self.calc_iou(gt_bbox, OgiImage.bbox2pt(pred_bbox), self.manager.th) for pred_bbox in self.pred]
-            self.metric.append(row)
-
-    def print_metric(self):
-        print(f"\nmetric:")
-        for row in self.metric:
-            print(f"{row}")
-        print(f"end of metric:\n")
-
-    @staticmethod
-    def bbox2pt(bbox) -> list:
-        return [bbox[0], bbox[1], bbox[0] + bbox[2], bbox[1] + bbox[3]]
-
-    @staticmethod
-    def calc_iou(gt_bbox: list, pred_bbox: list, condition: float):
-        x1_a, y1_a, x2_a, y2_a = gt_bbox
-        x1_b, y1_b, x2_b, y2_b = pred_bbox
-        # Calculate the area of intersection
-        inter_area = max(0, min(x2_a, x2_b) - max(x1_a, x1_b)) * max(0, min(y2_a, y2_b) - max(y1_a, y1_b))
-        # Calculate the areas of each rectangle
-        pred_area = (x2_b - x1_b) * (y2_b - y1_b)
-        gt_area = (x2_a - x1_a) * (y2_a - y1_a)
-        # Compute the IoU
-        union_area = pred_area + gt_area - inter_area
-        iou = inter_area / union_area if union_area != 0 else 0
-        # Compute the IoA
-        # ioa = inter_area / pred_area if pred_area != 0 else 0
-        return iou if iou >= condition else 0
-        # return ioa if ioa >= condition else 0
-
-    def __repr__(self):
-        return (f"\n{'-' * 100}\n{self.name}\nwidth: {self.width} height: "
-                f"{self.height}\n{self.pred}\n{self.gt}\n{self.metric}\n{'-' * 100}\n")
-
     def gui_info(self, scene_name):
         return {
             'scene_name': scene_name,
@@ -317,14 +585,6 @@ class OgiImage:
             'f1': self.fn,
         }
 
-    def get_bboxes_and_confidence_from_pred(self, annotations):
-        bboxes_list = []
-        confidence_list = []
-        for bbox, confidence in annotations:
-            bboxes_list.append(self.normalize_bbox(bbox, self.width, self.height))
-            confidence_list.append(confidence)
-        return bboxes_list, confidence_list
-
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Handle file paths and options")
@@ -344,18 +604,63 @@ def parse_arguments():
         help="A gt path (mandatory)"
     )
     parser.add_argument(
-        '-th', '-th',
-        type=float,
+        '-th', '--th',
+        type=parse_thresholds,
         required=True,
         dest='th',
-        help="thresh-hold condition for iou"
+        help="thresh-hold condition for iou, or a start:stop:step range to sweep the thresholds"
     )
     parser.add_argument(
-        '-dth', '-dth',
-        type=float,
+        '-dth', '--dth',
+        type=parse_thresholds,
         required=True,
         dest='dth',
-        help="detect-thresh-hold condition for general calculations"
+        help="detect-thresh-hold condition for general calculations, "
+             "or a start:stop:step range to score a th x d_th grid of the scene decisions"
+    )
+    parser.add_argument(
+        '-b', '--backend',
+        type=str,
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="iou backend, torch falls back to numpy when it is not installed"
+    )
+    parser.add_argument(
+        '-t', '--threads',
+        type=int,
+        default=None,
+        help="torch intra-op threads count (torch backend only)"
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=None,
+        help="evaluate the scenes in N processes"
+    )
+    parser.add_argument(
+        '-c', '--cache',
+        type=str,
+        default=None,
+        help="directory of the parsed gt/pred cache, parsed files are reused while they are unchanged"
+    )
+    parser.add_argument(
+        '--verify-cache',
+        action='store_true',
+        help="hash the cached files again on every hit, to detect edits keeping the file size and mtime"
+    )
+    parser.add_argument(
+        '-i', '--incremental',
+        type=str,
+        default=None,
+        help="directory of the per scene results, only the scenes whose gt, predictions or th changed "
+             "since the last run are evaluated again"
+    )
+    parser.add_argument(
+        '--curves',
+        type=str,
+        default=None,
+        help="csv path of the confidence precision/recall curves summary (ap, best f1) per scene and overall, "
+             "the curves points are written next to it"
     )
     parser.add_argument(
         '-s', '--save',
@@ -363,17 +668,58 @@ def parse_arguments():
         default=None,  # This makes it optional
         help="An optional string"
     )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help="json path of the wall time, calls count and memory peak of every stage of the run"
+    )
+    parser.add_argument(
+        '--cprofile',
+        type=str,
+        default=None,
+        help="path of a cProfile (pstats) dump of the run"
+    )
+    parser.add_argument(
+        '--log-level',
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default='WARNING',
+        help="DEBUG logs every scene and frame"
+    )
     return parser.parse_args()
 
 
 def ogi(args):
-    opt = {'model': 'ogi', 'gt': args.gt, 'pred': args.pred, 'th': args.th, 'd_th': args.dth}
+    thresholds = args.th if type(args.th) is list else None
+    d_thresholds = args.dth if type(args.dth) is list else None
+    # a sweep computes the iou once, at its lowest threshold
+    th = thresholds[0] if thresholds else args.th
+    opt = {'model': 'ogi', 'gt': args.gt, 'pred': args.pred, 'th': th,
+           'd_th': d_thresholds[0] if d_thresholds else args.dth,
+           'backend': args.backend, 'threads': args.threads, 'workers': args.workers, 'cache': args.cache,
+           'verify_cache': args.verify_cache, 'incremental': args.incremental}
 
     ogi_loader = OgiLoader(**opt)
     # print(ogi_loader)
     ogi_loader.build()
     # for t in ogi_loader.children:
     #     print(t)
+    if args.curves:
+        ogi_loader.export_curves(args.curves)
+    if d_thresholds:
+        rows = ogi_loader.decision_grid(thresholds or [th], d_thresholds)
+        print(format_sweep(rows, GRID_FIELDS_NAMES))
+        print(format_grid(rows))
+        if args.save:
+            write_csv(args.save, GRID_FIELDS_NAMES, rows)
+        return
+    if thresholds:
+        rows = ogi_loader.sweep(thresholds)
+        print(format_sweep(rows))
+        if args.save:
+            write_csv(args.save, SWEEP_FIELDS_NAMES, rows)
+        return
     print(ogi_loader)
     # print(ogi_loader.collect_children_data())
     # if args.save:
@@ -385,4 +731,6 @@ if __name__ == '__main__':
     # pred = (r'C:\Users\MosheMendelovich\Documents\percepto\cocompare\data\ogi'
     #         r'\predictions_Leaks_dataset_V5_13_prod_2024-09-04-12-46-08.json')
     # args.pred = pred
-    ogi(args)
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    with profile_run(args.profile, args.cprofile):
+        ogi(args)
@@ -0,0 +1,100 @@
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_enabled = False
+_stats: dict[str, dict] = {}
+_peaks: list[list[int]] = []  # [start, peak] traced memory of the open stages, outermost first
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def stage(name: str):
+    """
+    record the wall time, the calls count and the tracemalloc peak (above the memory traced at its start)
+    of a stage, stages nest. does nothing while profiling is off
+    """
+    if not _enabled:
+        yield
+        return
+    current, peak = tracemalloc.get_traced_memory()
+    if _peaks:
+        _peaks[-1][1] = max(_peaks[-1][1], peak)
+    tracemalloc.reset_peak()
+    _peaks.append([current, current])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - start
+        start_memory, peak = _peaks.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if _peaks:
+            _peaks[-1][1] = max(_peaks[-1][1], peak)
+        stats = _stats.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'peak_bytes': 0})
+        stats['calls'] += 1
+        stats['wall_s'] += wall
+        stats['peak_bytes'] = max(stats['peak_bytes'], peak - start_memory)
+
+
+def profiled(name: str):
+    """decorator recording every call of the function as a {name} stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profiled_iter(iterable, name: str):
+    """yield from {iterable} recording every next() as a {name} stage, for streamed reads"""
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            item = next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
+
+
+def report() -> dict:
+    return {name: {**stats, 'wall_s': round(stats['wall_s'], 6)} for name, stats in _stats.items()}
+
+
+@contextmanager
+def profile_run(report_path: str | None = None, cprofile_path: str | None = None):
+    """
+    profile the stages of the run when {report_path} is set and write their report json there,
+    {cprofile_path} dumps the cProfile stats of the whole run (pstats format).
+    the stages of worker processes are not collected, only the main process ones
+    """
+    global _enabled
+    profile = cProfile.Profile() if cprofile_path else None
+    if report_path:
+        _stats.clear()
+        _enabled = True
+        tracemalloc.start()
+    if profile:
+        profile.enable()
+    try:
+        with stage('total'):
+            yield
+    finally:
+        if profile:
+            profile.disable()
+            profile.dump_stats(cprofile_path)
+        if report_path:
+            _enabled = False
+            tracemalloc.stop()
+            with open(report_path, mode='w') as f:
+                json.dump(report(), f, indent=2)
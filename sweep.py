@@ -0,0 +1,71 @@
+import numpy as np
+from helpers import get_analysis
+
+SWEEP_FIELDS_NAMES = ['group_name', 'th', 'GT', 'PREDICT', 'TP', 'FP', 'FN', 'RECALL', 'PRECISION', 'F1_SCORE']
+GRID_FIELDS_NAMES = ['th', 'd_th', 'TP', 'FP', 'FN', 'RECALL', 'PRECISION', 'F1_SCORE']
+
+
+def parse_thresholds(value: str) -> float | list[float]:
+    """'0.3' is a single threshold, 'start:stop:step' is the sweep of the thresholds from start to stop included"""
+    if ':' not in value:
+        return float(value)
+    start, stop, step = map(float, value.split(':'))
+    if step <= 0 or stop < start:
+        raise ValueError(f"bad thresholds range {value!r}, expected start:stop:step with start <= stop and step > 0")
+    return np.round(np.arange(start, stop + step / 2, step), 6).tolist()
+
+
+def count_hits(best: np.ndarray, thresholds) -> np.ndarray:
+    """
+    number of boxes whose best iou is a hit at every threshold (best >= th, a zero iou never hits).
+    the best ious are sorted once and every threshold is a binary search.
+    """
+    best = np.sort(best)
+    first_hit = np.maximum(np.searchsorted(best, thresholds, side='left'), np.searchsorted(best, 0, side='right'))
+    return len(best) - first_hit
+
+
+def sweep_counts(gt_best: np.ndarray, pred_best: np.ndarray, thresholds) -> np.ndarray:
+    """
+    (T, 3) tp, fp, fn of every threshold from the best iou of each gt box (its row max)
+    and of each pred box (its column max), the same counts iou.count_hits gives for a single threshold.
+    """
+    tp = count_hits(gt_best, thresholds)
+    return np.stack([tp, len(pred_best) - count_hits(pred_best, thresholds), len(gt_best) - tp], axis=1)
+
+
+def sweep_rows(group_name: str, thresholds, gt_count: int, pred_count: int, counts: np.ndarray) -> list[dict]:
+    rows = []
+    for th, (tp, fp, fn) in zip(thresholds, counts.tolist()):
+        recall, precision, f1_score = get_analysis(tp, fp, fn)
+        rows.append({'group_name': group_name, 'th': th, 'GT': gt_count, 'PREDICT': pred_count,
+                     'TP': tp, 'FP': fp, 'FN': fn, 'RECALL': recall, 'PRECISION': precision, 'F1_SCORE': f1_score})
+    return rows
+
+
+def grid_rows(thresholds, d_thresholds, counts: np.ndarray) -> list[dict]:
+    """one row per (th, d_th) of the (T, D, 3) scenes tp, fp, fn counts"""
+    rows = []
+    for th, th_counts in zip(thresholds, counts.tolist()):
+        for d_th, (tp, fp, fn) in zip(d_thresholds, th_counts):
+            recall, precision, f1_score = get_analysis(tp, fp, fn)
+            rows.append({'th': th, 'd_th': d_th, 'TP': tp, 'FP': fp, 'FN': fn,
+                         'RECALL': recall, 'PRECISION': precision, 'F1_SCORE': f1_score})
+    return rows
+
+
+def format_sweep(rows: list[dict], fields: list[str] = SWEEP_FIELDS_NAMES) -> str:
+    widths = {field: max([len(str(field))] + [len(str(row[field])) for row in rows]) for field in fields}
+    lines = [' | '.join(str(field).ljust(widths[field]) for field in fields)]
+    lines.append('-+-'.join('-' * widths[field] for field in fields))
+    lines += [' | '.join(str(row[field]).ljust(widths[field]) for field in fields) for row in rows]
+    return '\n'.join(lines)
+
+
+def format_grid(rows: list[dict], value: str = 'F1_SCORE') -> str:
+    """the {value} of the grid_rows as a th (rows) x d_th (columns) heatmap"""
+    d_thresholds = list(dict.fromkeys(row['d_th'] for row in rows))
+    table = {}
+    for row in rows:
+        table.setdefault(row['th'], {'th/d_th': row['th']})[row['d_th']] = row[value]
+    return format_sweep(list(table.values()), ['th/d_th'] + d_thresholds)
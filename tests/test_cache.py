@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import pytest
+from cache import BoxCache, GroupsWriter, arrays_to_frames, frames_to_arrays, load_frames, load_frames_groups
+
+FRAMES = [
+    {'file_name': 'day1/0001.jpg', 'thermal_name': 't1', 'rgb_name': None, 'width': 640, 'height': 512,
+     'bboxes': [[1.5, 2, 3, 4], [5, 6, 7, 8]], 'confidence': [0.9, 0.1]},
+    {'file_name': 'day2/0001.jpg', 'thermal_name': 't2', 'rgb_name': 'r2', 'width': 320, 'height': 256,
+     'bboxes': [], 'confidence': []},
+    {'file_name': 'day2/0002.jpg', 'thermal_name': 't3', 'rgb_name': 'r3', 'width': 320, 'height': 256,
+     'bboxes': [[0, 0, 1, 1]], 'confidence': [1.0]},
+]
+
+
+def assert_frames_equal(frames, expected):
+    assert len(frames) == len(expected)
+    for frame, reference in zip(frames, expected):
+        assert frame.keys() == reference.keys()
+        for key, value in reference.items():
+            if key in ('bboxes', 'confidence'):
+                np.testing.assert_array_equal(np.ravel(frame[key]), np.ravel(np.asarray(value, dtype=np.float64)))
+            else:
+                assert frame[key] == value
+
+
+def write(path, text: str, mtime_ns: int | None = None):
+    with open(path, mode='w') as f:
+        f.write(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.mark.parametrize('frames', [FRAMES, FRAMES[1:2], []])
+def test_frames_arrays_round_trip(frames):
+    arrays = frames_to_arrays(frames)
+    assert all(array.dtype != object for array in arrays.values())
+    assert_frames_equal(arrays_to_frames(arrays), frames)
+
+
+def test_load_frames_hit(tmp_path):
+    source = tmp_path / 'gt.json'
+    write(source, 'gt')
+    cache = BoxCache(str(tmp_path / 'cache'))
+    assert_frames_equal(load_frames(cache, str(source), 'gt', lambda path: FRAMES), FRAMES)
+    # the second load is a hit, the source is not extracted again
+    assert_frames_equal(load_frames(cache, str(source), 'gt', lambda path: pytest.fail("extracted again")), FRAMES)
+
+
+def test_stale_entry_same_size_and_mtime(tmp_path):
+    source = tmp_path / 'gt.json'
+    write(source, 'version 1', mtime_ns=1_000_000_000)
+    cache = BoxCache(str(tmp_path / 'cache'), verify=True)
+    load_frames(cache, str(source), 'gt', lambda path: FRAMES)
+    write(source, 'version 2', mtime_ns=1_000_000_000)
+    assert cache.load(str(source), 'gt') is None
+    assert_frames_equal(load_frames(cache, str(source), 'gt', lambda path: FRAMES[:1]), FRAMES[:1])
+    assert_frames_equal(arrays_to_frames(cache.load(str(source), 'gt')), FRAMES[:1])
+
+
+def test_stale_entry_changed_stat(tmp_path):
+    source = tmp_path / 'gt.json'
+    write(source, 'version 1', mtime_ns=1_000_000_000)
+    cache = BoxCache(str(tmp_path / 'cache'))
+    load_frames(cache, str(source), 'gt', lambda path: FRAMES)
+    write(source, 'version 2', mtime_ns=2_000_000_000)
+    assert cache.load(str(source), 'gt') is None
+
+
+def test_load_frames_groups(tmp_path):
+    sources = [str(tmp_path / f'scene{i}.json') for i in range(3)]
+    for source in sources:
+        write(source, source)
+    cache = BoxCache(str(tmp_path / 'cache'))
+    groups = {sources[0]: FRAMES, sources[1]: [], sources[2]: FRAMES[2:]}
+    for extract in (groups.__getitem__, lambda path: pytest.fail("extracted again")):
+        for frames, expected in zip(load_frames_groups(cache, sources, 'gt_dir', extract), groups.values()):
+            assert_frames_equal(frames, expected)
+
+
+def test_groups_writer_chunks(tmp_path):
+    source = tmp_path / 'pred.json'
+    write(source, 'pred')
+    cache = BoxCache(str(tmp_path / 'cache'))
+    groups = [('scene1', FRAMES), ('scene2', []), ('scene3', FRAMES[:1]), ('scene4', FRAMES[1:])]
+    writer = GroupsWriter(cache, str(source), 'pred', chunk_frames=2)
+    for name, frames in groups:
+        writer.add(name, frames)
+    writer.commit()
+    loaded = list(cache.load_groups(str(source), 'pred'))
+    assert [name for name, _ in loaded] == [name for name, _ in groups]
+    for (_, frames), (_, expected) in zip(loaded, groups):
+        assert_frames_equal(frames, expected)
+
+
+def test_groups_writer_close_drops_the_entry(tmp_path):
+    source = tmp_path / 'pred.json'
+    write(source, 'pred')
+    cache = BoxCache(str(tmp_path / 'cache'))
+    writer = GroupsWriter(cache, str(source), 'pred')
+    writer.add('scene1', FRAMES)
+    writer.close()
+    assert cache.load_groups(str(source), 'pred') is None
+    assert os.listdir(cache.path) == []
+
+
+def test_evict(tmp_path):
+    cache = BoxCache(str(tmp_path / 'cache'), max_bytes=4096)
+    for i in range(20):
+        source = tmp_path / f'gt{i}.json'
+        write(source, str(i))
+        load_frames(cache, str(source), 'gt', lambda path: FRAMES)
+    assert cache.size <= cache.max_bytes
+    assert 0 < len(os.listdir(cache.path)) < 20
+    # the most recent entry is kept
+    assert cache.load(str(tmp_path / 'gt19.json'), 'gt') is not None
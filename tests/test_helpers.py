@@ -0,0 +1,42 @@
+import io
+import json
+import pytest
+from helpers import JsonStream, iter_json_items
+
+DOCUMENT = {
+    'version': 1.5,
+    'scenes': {
+        'a_b_scene1_thermal': {'images': [{'id': 1, 'file_name': 'day1/0001.jpg'}], 'annotations': []},
+        'a_b_scene2_thermal': {'images': [], 'annotations': [{'bbox': [1.25, -2, 3e-3, 1e10], 'confidence': 0.5}]},
+        'empty': {},
+        'text': "a \"quoted\" \\ value, with : and { } [ ]",
+    },
+    'numbers': [0, -12345678901234567890, 3.14159, 1e-7, True, False, None],
+    'tail': 'after the scenes',
+}
+
+
+class NamedStringIO(io.StringIO):
+    name = 'document.json'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_json_stream_items(chunk_size, indent):
+    text = json.dumps(DOCUMENT, indent=indent)
+    stream = JsonStream(NamedStringIO(text), chunk_size)
+    assert dict(stream.items()) == json.loads(text)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1 << 20])
+def test_iter_json_items(tmp_path, chunk_size):
+    path = tmp_path / 'pred.json'
+    path.write_text(json.dumps(DOCUMENT))
+    assert dict(iter_json_items(str(path), 'scenes', chunk_size)) == DOCUMENT['scenes']
+    assert list(iter_json_items(str(path), 'missing', chunk_size)) == []
+
+
+def test_json_stream_truncated():
+    stream = JsonStream(NamedStringIO(json.dumps(DOCUMENT)[:-10]), 4)
+    with pytest.raises(ValueError):
+        dict(stream.items())
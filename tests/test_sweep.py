@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import make_ogi, make_tnd
+from ogi import OgiLoader
+from sweep import parse_thresholds, sweep_counts
+from tnd import TndLoader
+
+THRESHOLDS = [0.0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0]
+D_THRESHOLDS = [0.0, 0.3, 0.6, 1.0]
+
+
+@pytest.fixture(scope='module')
+def ogi_data(tmp_path_factory):
+    return make_ogi(str(tmp_path_factory.mktemp('ogi')), scenes=6, frames=10, boxes=4)
+
+
+@pytest.fixture(scope='module')
+def tnd_data(tmp_path_factory):
+    return make_tnd(str(tmp_path_factory.mktemp('tnd')), frames=60, boxes=4, models=2)
+
+
+def ogi_loader(ogi_data, th, d_th=0.3):
+    gt_dir, pred_path = ogi_data
+    loader = OgiLoader(model='ogi', gt=gt_dir, pred=pred_path, th=th, d_th=d_th)
+    loader.build()
+    return loader
+
+
+def tnd_loader(tnd_data, th):
+    gt_path, pred_paths = tnd_data
+    loader = TndLoader(model='tnd', gt=[gt_path], pred=pred_paths, th=th)
+    loader.build()
+    return loader
+
+
+def test_parse_thresholds():
+    assert parse_thresholds('0.3') == 0.3
+    assert parse_thresholds('0.1:0.5:0.2') == [0.1, 0.3, 0.5]
+    with pytest.raises(ValueError):
+        parse_thresholds('0.5:0.1:0.2')
+
+
+def test_sweep_counts_single_threshold():
+    gt_best = np.array([0.0, 0.2, 0.5, 0.9])
+    pred_best = np.array([0.0, 0.5, 0.9])
+    # a zero iou never hits, even at th 0
+    np.testing.assert_array_equal(sweep_counts(gt_best, pred_best, [0.0, 0.5, 1.0]),
+                                  [[3, 1, 1], [2, 1, 2], [0, 3, 4]])
+
+
+def test_ogi_sweep_matches_rebuilds(ogi_data):
+    rows = ogi_loader(ogi_data, THRESHOLDS[0]).sweep(THRESHOLDS)
+    for th, row in zip(THRESHOLDS, rows):
+        gt_count, pred_count, tp, fp, fn, _ = ogi_loader(ogi_data, th).collect_children_data()
+        assert (row['th'], row['GT'], row['PREDICT'], row['TP'], row['FP'], row['FN']) == \
+               (th, gt_count, pred_count, tp, fp, fn)
+
+
+def test_ogi_decision_grid_matches_rebuilds(ogi_data):
+    rows = ogi_loader(ogi_data, THRESHOLDS[0]).decision_grid(THRESHOLDS, D_THRESHOLDS)
+    expected = {}
+    for th in THRESHOLDS:
+        for d_th in D_THRESHOLDS:
+            _, _, tp, fp, fn, _ = ogi_loader(ogi_data, th, d_th).collect_children_data()
+            expected[th, d_th] = (tp, fp, fn)
+    assert {(row['th'], row['d_th']): (row['TP'], row['FP'], row['FN']) for row in rows} == expected
+
+
+def test_tnd_sweep_matches_rebuilds(tnd_data):
+    rows = tnd_loader(tnd_data, THRESHOLDS[0]).sweep(THRESHOLDS)
+    expected = []
+    for th in THRESHOLDS:
+        expected += [(child.name, th, *child.get_info()[1:6]) for child in tnd_loader(tnd_data, th).children]
+    got = [(row['group_name'], row['th'], row['GT'], row['PREDICT'], row['TP'], row['FP'], row['FN'])
+           for row in rows]
+    assert sorted(got) == sorted(expected)
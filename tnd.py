@@ -1,107 +1,127 @@
 import argparse
+import logging
 import os
+import numpy as np
 from helpers import *
 from BaseLoader import BaseLoader
+from BaseImage import BaseImage, SceneBuffer
+from cache import BoxCache, load_frames
+from iou import BACKENDS, DEFAULT_BACKEND, get_hits
+from profiler import profile_run, profiled
+from sweep import SWEEP_FIELDS_NAMES, format_sweep, parse_thresholds, sweep_counts, sweep_rows
 
 
 CRITERIA_FLAG = True
 IOA = 'ioa'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
 FIELDS_NAMES = ['rgb_name', 'thermal_name', 'GT', 'PREDICT', 'FN', 'FP', 'TP']
 
+logger = logging.getLogger(__name__)
+
 
 class TndLoader(BaseLoader):
+    @profiled('build')
     def build(self):
+        gt_data = self.shared_gt(self.gt, lambda: self.load_gt_data(self.gt, self.cache))
         self.children = [Tnd(
-            gt_paths=self.gt,
+            gt_data=gt_data,
             pred_path=path,
-            th=self.th
+            th=self.th,
+            cache=self.cache
         ) for path in self.pred]
 
-    def collect_children_data(self):
-        for child in self.children:
-            images_count, gt_count, pred_count, tp, fp, fn, th = child.get_info()
-            self.gt_count += gt_count
-            self.pred_count += pred_count
-            self.tp += tp
-            self.fp += fp
-            self.fn += fn
-            self.th = th
-        return self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
+    @staticmethod
+    def load_gt_data(paths, cache: BoxCache | None = None) -> ParsedGt:
+        """parse the gt once, the returned ParsedGt is shared by every Tnd child"""
+        if type(paths) is str:  # verify if paths is only one path, to be in a list.
+            paths = [paths]
+        if is_csv(paths[0]):
+            logger.info("go through csv")
+            return parse_gt(load_frames(cache, paths[0], 'tnd_gt', lambda p: extract_gt_csv(read_csv(p))))
+        else:
+            logger.info("go through json")
+            return parse_gt(load_frames(cache, paths[0], 'tnd_gt', lambda p: extract_cocos(read_jsons([p]))))
+
+    def sweep(self, thresholds) -> list[dict]:
+        """the summary of every child at every iou threshold from the iou computed once"""
+        return [row for child in self.children
+                for row in sweep_rows(child.name, thresholds, child.gt_count, child.pred_count,
+                                      child.sweep(thresholds))]
 
     def __repr__(self):
         gt_count, pred_count, tp, fp, fn, th = self.collect_children_data()
-        recall, precision, f1_score = get_analysis(gt_count, pred_count, tp)
+        recall, precision, f1_score = get_analysis(tp, fp, fn)
         return (f"{'-' * 100}\ntnd summery:\n{gt_count=}, {pred_count=}, {tp=}, {fp=}, {fn=}\n"
                 f"{th=}, {precision=}, {recall=}, {f1_score=}\n{'-' * 100}")
 
 
 class Tnd:
-    def __init__(self, gt_paths, pred_path, th):
+    def __init__(self, gt_data: ParsedGt, pred_path, th, cache: BoxCache | None = None):
         self.name = os.path.basename(pred_path).split('.')[0]
-        self.gt_list = self.load_gt_data(gt_paths)
-        self.pred_list = self.load_pred_data(pred_path)
-        # fill the below with process_data method
-        self.images_list = self.get_images_names()
-        self.images_count = len(self.images_list)
+        pred_list = self.load_pred_data(pred_path, cache)
+        frames = join_frames(gt_data.index, index_frames(pred_list, 'thermal_name'))
         self.gt_count = 0
         self.pred_count = 0
-        self.annotations = self.build_annotations()
+        # the raw pred records are dropped once the buffer holds their boxes
+        annotations = self.build_annotations(frames)
+        self.images_list = [ann['thermal_name'] for ann in annotations]
+        self.images_count = len(self.images_list)
         self.th = th
         self.tp = self.fp = self.fn = 0
-        self.images: list[TndImage] = self.create_images()
+        self.buffer = SceneBuffer(annotations)
+        self.images: list[TndImage] = self.create_images(annotations)
 
-    def load_pred_data(self, path):
+    def load_pred_data(self, path, cache: BoxCache | None = None):
         if is_csv(path):
             data = read_csv(path)
             # return self.extract_pred_from_csv(data)
         else:
-            data = read_json(path)
-            return extract_pred_json(data)
-
-    def load_gt_data(self, paths):
-        if type(paths) is str:  # verify if paths is only one path, to be in a list.
-            paths = [paths]
-        if is_csv(paths[0]):
-            print("go through csv")
-            datas = read_csv(paths[0])
-            return extract_gt_csv(datas)
-        else:
-            print("go through json")
-            datas = read_jsons(paths)
-            return extract_cocos(datas)
-
-    def get_images_names(self, ):
-        """intersection_of_lists"""
-        set1 = {pred_ann['thermal_name'] for pred_ann in self.pred_list}
-        set2 = {gt_ann['file_name'] for gt_ann in self.gt_list}
-        return sorted(list(set1.intersection(set2)))
+            return load_frames(cache, path, 'tnd_pred', lambda p: extract_pred_json(read_json(p)))
 
     def get_info(self):
         return self.images_count, self.gt_count, self.pred_count, self.tp, self.fp, self.fn, self.th
 
-    def create_images(self):
-        images = [TndImage(self, data) for data in self.annotations]
-        images.sort(key=lambda x: x.name)
-        return images
-
-    def build_annotations(self):
+    def set_threshold(self, th: float):
+        self.th = th
+        self.evaluate_images()
+
+    def create_images(self, annotations):
+        self.evaluate_images()
+        return [TndImage(self, i, data) for i, data in enumerate(annotations)]
+
+    def evaluate_images(self):
+        """check the collisions of all the frames in padded batches instead of frame by frame"""
+        self.tp, self.fp, self.fn = self.buffer.evaluate(self.th).sum(axis=0).tolist()
+
+    def sweep(self, thresholds):
+        """(T, 3) tp, fp, fn at every threshold"""
+        return sweep_counts(self.buffer.gt_best, self.buffer.pred_best, thresholds)
+
+    def curve_inputs(self):
+        """(gt_confidence, confidence, hits) of curves.pr_curve, a pred without confidence has a confidence of 1"""
+        return (self.buffer.gt_confidence, self.buffer.confidences.astype(np.float64),
+                get_hits(self.buffer.pred_best, self.th))
+
+    def build_annotations(self, frames):
+        """
+        merge the joined frames into one record per frame sorted by name, see helpers.frame_key for the matching
+        rule. the last pred record of a frame wins and all of its gt bboxes are kept
+        """
         annotations = []
-        for file_name in self.images_list:
-            new_ann = {'thermal_name': file_name, 'gt_bboxes': []}
-            for pred in self.pred_list:
-                if file_name in pred['thermal_name']:
-                    new_ann.update({
-                        'rgb_name': pred['rgb_name'],
-                        'width': pred['width'],
-                        'height': pred['height'],
-                        'pred_bboxes': pred['bboxes']
-                    })
-            for gt in self.gt_list:
-                if file_name in gt['file_name']:
-                    new_ann['gt_bboxes'] += (gt['bboxes'])
+        for _, gt_frames, pred_frames in frames:
+            pred = pred_frames[-1]
+            new_ann = {
+                'thermal_name': gt_frames[0]['file_name'],
+                'rgb_name': pred['rgb_name'],
+                'width': pred['width'],
+                'height': pred['height'],
+                'pred_bboxes': pred['bboxes'],
+                'gt_bboxes': [bbox for gt in gt_frames for bbox in gt['bboxes']]
+            }
             self.pred_count += len(new_ann['pred_bboxes'])
             self.gt_count += len(new_ann['gt_bboxes'])
             annotations.append(new_ann)
+        annotations.sort(key=lambda ann: ann['thermal_name'])
         return annotations
 
     def get_image_index(self, file_name: str) -> int:
@@ -122,23 +142,18 @@ class Tnd:
     def __repr__(self):
         name = self.name
         images_count, gt, pred, tp, fp, fn, th = self.get_info()
-        recall, precision, f1_score = get_analysis(gt, pred, tp)
+        recall, precision, f1_score = get_analysis(tp, fp, fn)
         return (f"{'-' * 50}\n{name=}\n{gt=}, {pred=}, {tp=}, {fp=}, {fn=}\n"
                 f"{th=}, {precision=}, {recall=}, {f1_score=}\n{'-' * 50}")
 
 
-class TndImage:
-    def __init__(self, manager, data):
-        self.manager: Tnd = manager
-        self.name = data['thermal_name']
+class TndImage(BaseImage):
+    __slots__ = ('rgb_name',)
+
+    def __init__(self, manager, index, data):
+        super().__init__(manager, index, data)
+        self.manager: Tnd
         self.rgb_name = data['rgb_name']
-        self.width = data['width']
-        self.height = data['height']
-        self.pred = self.normalize_bboxes(data['pred_bboxes'])
-        self.gt = self.normalize_bboxes(data['gt_bboxes'])
-        self.metric = []
-        self.tp = self.fp = self.fn = 0
-        self.check_collisions()
 
     def export_data(self):
         return {
@@ -151,74 +166,6 @@ class TndImage:
             'FN': self.fn
         }
 
-    def get_info(self):
-        return len(self.gt), len(self.pred), self.tp, self.fp, self.fn
-
-    def normalize_bboxes(self, bboxes):
-        return [self.normalize_bbox(bbox, self.width, self.height) for bbox in bboxes]
-
-    @staticmethod
-    def normalize_bbox(bbox, width, height):
-        x, y, w, h = bbox
-        return [x / width, y / height, w / width, h / height]
-
-    def count_metrics(self):
-        # self.print_metric()
-        for row in self.metric:
-            self.tp += 1 if sum(row) else 0
-            self.manager.tp += 1 if sum(row) else 0
-            if sum(row) == 0:
-                self.fn += 1
-                self.manager.fn += 1
-        # Count False Positives (FP)
-        num_columns = len(self.metric[0])
-        for col_idx in range(num_columns):
-            column_sum = sum([self.metric[row_idx][col_idx] for row_idx in range(len(self.metric))])
-            self.fp += 0 if column_sum else 1
-            self.manager.fp += 0 if column_sum else 1
-        # print(f"True Positives (TP): {self.tp}")
-        # print(f"True Negatives (TN): {self.tn}")
-        # print(f"False Positives (FP): {self.fp}")
-
-    def check_collisions(self):
-        for gt_bbox in self.gt:
-            gt_bbox = TndImage.bbox2pt(gt_bbox)
-
-            row = [self.calc_iou(gt_bbox, TndImage.bbox2pt(pred_bbox), self.manager.th) for pred_bbox in self.pred]
-            self.metric.append(row)
-        # self.count_metrics()
-
-    def print_metric(self):
-        print(f"\nmetric:")
-        for row in self.metric:
-            print(f"{row}")
-        print(f"end of metric:\n")
-
-    @staticmethod
-    def bbox2pt(bbox) -> list:
-        return [bbox[0], bbox[1], bbox[0] + bbox[2], bbox[1] + bbox[3]]
-
-    @staticmethod
-    def calc_iou(gt_bbox: list, pred_bbox: list, condition: float):
-        x1_a, y1_a, x2_a, y2_a = gt_bbox
-        x1_b, y1_b, x2_b, y2_b = pred_bbox
-        # Calculate the area of intersection
-        inter_area = max(0, min(x2_a, x2_b) - max(x1_a, x1_b)) * max(0, min(y2_a, y2_b) - max(y1_a, y1_b))
-        # Calculate the areas of each rectangle
-        pred_area = (x2_b - x1_b) * (y2_b - y1_b)
-        gt_area = (x2_a - x1_a) * (y2_a - y1_a)
-        # Compute the IoU
-        union_area = pred_area + gt_area - inter_area
-        iou = inter_area / union_area if union_area != 0 else 0
-        # Compute the IoA
-        # ioa = inter_area / pred_area if pred_area != 0 else 0
-        return iou if iou >= condition else 0
-        # return ioa if ioa >= condition else 0
-
-    def __repr__(self):
-        return (f"\n{'-' * 100}\n{self.name}\nwidth: {self.width} height: "
-                f"{self.height}\n{self.pred}\n{self.gt}\n{self.metric}\n{'-' * 100}\n")
-
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description="Handle file paths and options")
@@ -238,9 +185,40 @@ def parse_arguments():
     )
     parser.add_argument(
         '-th', '--th',
-        type=float,
+        type=parse_thresholds,
         required=True,
-        help="thresh_hold condition for iou"
+        help="thresh_hold condition for iou, or a start:stop:step range to sweep the thresholds"
+    )
+    parser.add_argument(
+        '-b', '--backend',
+        type=str,
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="iou backend, torch falls back to numpy when it is not installed"
+    )
+    parser.add_argument(
+        '-t', '--threads',
+        type=int,
+        default=None,
+        help="torch intra-op threads count (torch backend only)"
+    )
+    parser.add_argument(
+        '-c', '--cache',
+        type=str,
+        default=None,
+        help="directory of the parsed gt/pred cache, parsed files are reused while they are unchanged"
+    )
+    parser.add_argument(
+        '--verify-cache',
+        action='store_true',
+        help="hash the cached files again on every hit, to detect edits keeping the file size and mtime"
+    )
+    parser.add_argument(
+        '--curves',
+        type=str,
+        default=None,
+        help="csv path of the confidence precision/recall curves summary (ap, best f1) per pred file and overall, "
+             "the curves points are written next to it"
     )
     parser.add_argument(
         '-s', '--save',
@@ -248,12 +226,33 @@ def parse_arguments():
         default=None,  # This makes it optional
         help="An optional string"
     )
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help="json path of the wall time, calls count and memory peak of every stage of the run"
+    )
+    parser.add_argument(
+        '--cprofile',
+        type=str,
+        default=None,
+        help="path of a cProfile (pstats) dump of the run"
+    )
+    parser.add_argument(
+        '--log-level',
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default='WARNING',
+        help="logging level, INFO logs the gt file format"
+    )
     return parser.parse_args()
 
 
 if __name__ == '__main__':
     def tnd_ind(args):
-        tnd_loader = TndLoader(model='tnd', gt=args.gt, pred=args.pred, th=args.th)
+        tnd_loader = TndLoader(model='tnd', gt=args.gt, pred=args.pred, th=args.th,
+                               backend=args.backend, threads=args.threads, cache=args.cache,
+                               verify_cache=args.verify_cache)
         tnd_loader.build()
         for child in tnd_loader.children:
             print(f"\n{child}")
@@ -261,9 +260,26 @@ if __name__ == '__main__':
                 save_path = f"{os.path.splitext(args.save)[0]}_{child.name}.csv"
                 child.export_data(save_path)
 
+    def tnd_sweep(args):
+        # the iou is computed once, at the lowest threshold
+        tnd_loader = TndLoader(model='tnd', gt=args.gt, pred=args.pred, th=args.th[0],
+                               backend=args.backend, threads=args.threads, cache=args.cache,
+                               verify_cache=args.verify_cache)
+        tnd_loader.build()
+        if args.curves:
+            tnd_loader.export_curves(args.curves)
+        rows = tnd_loader.sweep(args.th)
+        print(format_sweep(rows))
+        if args.save:
+            write_csv(args.save, SWEEP_FIELDS_NAMES, rows)
+
     def tnd_gen(args):
-        tnd_loader = TndLoader(model='tnd', gt=args.gt, pred=args.pred, th=args.th)
+        tnd_loader = TndLoader(model='tnd', gt=args.gt, pred=args.pred, th=args.th,
+                               backend=args.backend, threads=args.threads, cache=args.cache,
+                               verify_cache=args.verify_cache)
         tnd_loader.build()
+        if args.curves:
+            tnd_loader.export_curves(args.curves)
 
         # if args.save:
         #     tnd_loader.export_data(args.save)
@@ -272,5 +288,10 @@ if __name__ == '__main__':
         print(tnd_loader)
 
     args = parse_arguments()
-    # tnd_ind(args)
-    tnd_gen(args)
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    with profile_run(args.profile, args.cprofile):
+        # tnd_ind(args)
+        if type(args.th) is list:
+            tnd_sweep(args)
+        else:
+            tnd_gen(args)
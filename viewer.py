@@ -1,10 +1,17 @@
+import argparse
+import math
 import os
 from tkinter import *
 from tkinter import ttk, filedialog, colorchooser
-from PIL import ImageTk, Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import ImageTk, Image
 from tnd import *
 from ogi import *
 from BaseRoot import Root
+from error_index import ERROR_KINDS, ErrorFrameIndex
+from frame_index import FrameSearchIndex
+from image_cache import ImageCache, PREFETCH_FRAMES
+from metrics_table import METRICS_COLUMNS, MetricsRows
 from wizard import Wizard
 
 font = ('helvetica', 10)
@@ -12,6 +19,16 @@ font = ('helvetica', 10)
 VERSION = "1.0.0"
 GT_TYPE = "gt"
 PREDICT_TYPE = "predict"
+BOX_TAG = "box"
+RESIZE_FAST_MS = 30  # at most one fast render per this many ms while the window is resized
+RESIZE_IDLE_MS = 150  # the final render waits for the resize events to stop this long
+SCENES_POLL_MS = 100  # lazy mode, how often the scenes built in the background are collected
+FIND_RESULTS_LIMIT = 1000  # the find window lists at most this many frames
+ALL_FRAMES = 'all'  # the error filter navigating every frame
+TABLE_MODES = ('scenes', 'frames')
+TABLE_ROW_HEIGHT = 20  # used when the ttk theme does not set the Treeview rowheight
+TABLE_HEADER_HEIGHT = 25
+TABLE_WHEEL_ROWS = 3  # rows scrolled by a mouse wheel step
 
 rect_thick = 2
 font_size = 15
@@ -48,10 +65,17 @@ class Viewer:
     def __init__(self, **options):
         self.toggle_visible = False
         self.model = options['model']
+        self.scene_builder: SceneBuilder | None = None
+        self.scenes_built = 0
         # print(self.model)
         self.modules_parent: OgiLoader | TndLoader = self.set_module_type(**options)
 
         self.module = self.modules_parent.current
+        # the frames of the lazy scenes are indexed as they are built, see poll_scenes
+        self.frame_index = FrameSearchIndex.from_loader(self.modules_parent)
+        self.error_index = ErrorFrameIndex.from_loader(self.modules_parent)
+        self.error_filter: str | None = None  # prev / next navigate only these error frames when set
+        self.image_cache = ImageCache()
         self.root = Cocompare(self)
         images_path = options['images'] if 'images' in options else options['gt']
 
@@ -67,8 +91,13 @@ class Viewer:
         self.slide = Slide(master=main_frame, viewer=self, images_path=images_path)
         self.bottom_frame = BottomFrame(self)
 
+        if self.scene_builder:
+            self.scene_builder.request(self.modules_parent.index)
+            self.scene_builder.start()
+            self.root.after(SCENES_POLL_MS, self.poll_scenes)
         self.root.focus_force()
         self.root.mainloop()
+        self.image_cache.shutdown()
 
     def export_results(self):
         if file_path := filedialog.asksaveasfilename(
@@ -94,6 +123,9 @@ class Viewer:
         self.toggle_visible = not self.toggle_visible
 
     def on_resize(self, event):
+        # the root binding gets the <Configure> of every child widget too, only the window resize matters here
+        if event.widget is not self.root:
+            return
         if self.toggle_visible:
             self.paned_window.paneconfig(self.slide, )  # width=self.slide_frame.winfo_width() - 200)
         else:
@@ -101,14 +133,90 @@ class Viewer:
 
     def set_module_type(self, **options):
         module = OgiLoader(**options) if options['model'] == "ogi" else TndLoader(**options)
-        module.build()
+        if options.get('lazy') and options['model'] == "ogi":
+            # the scenes are listed now and built in the background, see poll_scenes
+            module.build_lazy()
+            self.scene_builder = SceneBuilder(module)
+        else:
+            module.build()
         return module
 
     def update_module_parent(self, index):
         self.modules_parent.index = index
         self.module = self.modules_parent.current
+        if isinstance(self.module, PendingScene):
+            self.scene_builder.request(index)
         self.slide.display()
 
+    def show_frame(self, scene_index: int, frame_index: int):
+        """display the frame {frame_index} of the scene {scene_index}"""
+        self.slide.index = frame_index
+        self.update_module_parent(scene_index)
+        self.bottom_frame.update_info()
+
+    def jump_error(self, step: int):
+        """display the next ({step} > 0) or previous error frame of the filter kind (any error without filter)"""
+        parent = self.modules_parent
+        if location := self.error_index.step(self.error_filter or 'any', parent.index, self.slide.index, step):
+            self.show_frame(*location)
+
+    def set_error_filter(self, kind: str):
+        self.error_filter = None if kind == ALL_FRAMES else kind
+
+    def poll_scenes(self):
+        """lazy mode: swap the scenes built in the background into the loader and show the progress"""
+        alive = self.scene_builder.is_alive()
+        parent = self.modules_parent
+        indexes = []  # the scenes built since the previous poll
+        while not self.scene_builder.built.empty():
+            index, scene = self.scene_builder.built.get_nowait()
+            self.scenes_built += 1
+            if scene is None:
+                parent.children[index].status = 'no predictions'
+            else:
+                parent.update_child(index, scene)
+                indexes.append(index)
+                self.frame_index.add_scene(index, [image.name for image in scene.images])
+                self.error_index.set_scene(index, scene.buffer.counts)
+            if index == parent.index:
+                self.slide.index = 0
+                self.update_module_parent(index)
+                self.bottom_frame.update_info()
+        if indexes:
+            self.list_frame.update_scenes(indexes)
+        self.bottom_frame.update_progress(self.scenes_built, len(parent.children))
+        if alive:
+            self.root.after(SCENES_POLL_MS, self.poll_scenes)
+
+
+class RenderScheduler:
+    """
+    coalesce the <Configure> events of a widget: a burst of events renders the latest size fast (low quality)
+    at most every {fast_delay} ms, and once no event came for {delay} ms the latest size is rendered in high quality
+    """
+    def __init__(self, widget: Misc, render, fast_delay: int = RESIZE_FAST_MS, delay: int = RESIZE_IDLE_MS):
+        self.widget = widget
+        self.render = render
+        self.fast_delay = fast_delay
+        self.delay = delay
+        self._fast = None
+        self._final = None
+
+    def request(self, event=None):
+        if self._fast is None:
+            self._fast = self.widget.after(self.fast_delay, self._render_fast)
+        if self._final is not None:
+            self.widget.after_cancel(self._final)
+        self._final = self.widget.after(self.delay, self._render_final)
+
+    def _render_fast(self):
+        self._fast = None
+        self.render(fast=True)
+
+    def _render_final(self):
+        self._final = None
+        self.render()
+
 
 class Cocompare(Root):
     WIDTH = 800
@@ -124,6 +232,8 @@ class Cocompare(Root):
 
         self.bind('<Escape>', lambda x: self.quit())
         self.bind('<F11>', self.toggle_window_state)
+        self.bind('<Control-Right>', lambda event: self.viewer.jump_error(1))
+        self.bind('<Control-Left>', lambda event: self.viewer.jump_error(-1))
         self.create_menu()
 
     def toggle_window_state(self, event=None):
@@ -199,6 +309,7 @@ class FindWindow(TopWindow):
         self.file_name_entry = None
         self.chr_var = StringVar()
         self.listbox = None
+        self.hits: list[int] = []  # the frame_index entries listed
         self.create_window()
 
     def create_window(self):
@@ -207,6 +318,7 @@ class FindWindow(TopWindow):
         entry = ttk.Entry(self.frame, textvariable=self.chr_var, width=70)
         entry.grid(row=1, column=0, padx=5, pady=15)
         entry.bind('<Return>', self.update_listbox)
+        entry.bind('<KeyRelease>', self.update_listbox)
 
         btn = ttk.Button(self.frame, text="Find", command=self.update_listbox, width=5)
         btn.grid(row=1, column=1, pady=10, padx=10)
@@ -225,18 +337,24 @@ class FindWindow(TopWindow):
         scrollbar.config(command=self.listbox.yview)
 
         self.listbox.bind("<Double-Button-1>", self.update_image)
+        self.listbox.bind("<Return>", self.update_image)
 
     def update_listbox(self, e=None):
         chars = self.chr_var.get()
         self.fill_list_box(chars)
 
     def fill_list_box(self, chars):
+        """the frames of all the scenes whose name contains {chars}, as 'scene / frame'"""
         self.listbox.delete(0, END)
-        names = self.viewer.module.names_list
-        [self.listbox.insert(END, name) for name in names if (chars and chars in name)]
+        index = self.viewer.frame_index
+        self.hits = index.search(chars)[:FIND_RESULTS_LIMIT]
+        children = self.viewer.modules_parent.children
+        self.listbox.insert(END, *(f"{children[index.location(entry)[0]].name} / {index.names[entry]}"
+                                   for entry in self.hits))
 
     def update_image(self, event=None):
-        pass
+        if selected := self.listbox.curselection():
+            self.viewer.show_frame(*self.viewer.frame_index.location(self.hits[selected[0]]))
 
 
 class EditWindow(TopWindow):
@@ -246,6 +364,8 @@ class EditWindow(TopWindow):
         self.pred_color_picker = None
         self.font_size = None
         self.rect_thick = None
+        self.show_gt = BooleanVar(value=viewer.slide.gt)
+        self.show_predict = BooleanVar(value=viewer.slide.predict)
 
         self.create_edit_options()
 
@@ -268,60 +388,186 @@ class EditWindow(TopWindow):
         self.create_color_button("Select GT color", 2, self.choose_color, GT_TYPE)
         self.create_color_button("Select Predict color", 3, self.choose_color, PREDICT_TYPE)
 
+        ttk.Checkbutton(self.frame, text="Show GT", variable=self.show_gt,
+                        command=self.update_parameters).grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(self.frame, text="Show Predict", variable=self.show_predict,
+                        command=self.update_parameters).grid(row=5, column=0, padx=5, pady=5, sticky="w")
+
         btn = ttk.Button(self.frame, text="Apply", command=self.update_parameters, width=5, padding=(10, 0))
-        btn.grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        btn.grid(row=6, column=0, padx=5, pady=5, sticky="w")
 
     def update_parameters(self):
         global font_size, rect_thick
         rect_thick = self.rect_thick.get()
         font_size = self.font_size.get()
-        self.viewer.slide.set_image()
+        self.viewer.slide.gt = self.show_gt.get()
+        self.viewer.slide.predict = self.show_predict.get()
+        # only the boxes items are updated, the image is not redrawn
+        self.viewer.slide.update_overlay()
         self.lift()
 
 
 class ListFrame(Frame):
+    """
+    the metrics table of the scenes, or of the frames of all the scenes. the Treeview only holds the visible rows:
+    scrolling, sorting and filtering rewrite their values from the MetricsRows view, no row widget is created
+    """
     def __init__(self, master, viewer: Viewer):
         super().__init__(master)  # Height to match window
         self.viewer = viewer
-
-        self.path_listbox = self.create_listbox()
-
-        # Button under the Listbox
+        self.mode = StringVar(value=TABLE_MODES[0])
+        self.filter_text = StringVar()
+        self.rows: MetricsRows | None = None
+        self.sort_by: tuple[str, bool] | None = None  # (column, descending)
+        self.offset = 0  # view position of the first visible row
+        self.selected: int | None = None  # view position of the selected row
+        self.items: list[str] = []  # the Treeview items of the visible rows
+
+        self.create_controls()
+        self.tree, self.scrollbar = self.create_table()
+
+        # Button under the table
         self.update_btn = ttk.Button(self, text="Update", command=self.update_path)
-        self.update_btn.grid(row=1, column=0, )
+        self.update_btn.grid(row=2, column=0, columnspan=2)
 
-        # Configure the listbox frame to adjust with the content
-        self.grid_rowconfigure(0, weight=1)
+        # Configure the table to adjust with the content
+        self.grid_rowconfigure(1, weight=1)
         self.grid_columnconfigure(0, weight=1)
+        self.load_rows()
+
+    def create_controls(self):
+        frame = ttk.Frame(self)
+        frame.grid(row=0, column=0, columnspan=2, sticky=EW)
+        mode = ttk.Combobox(frame, textvariable=self.mode, values=TABLE_MODES, width=7, state='readonly')
+        mode.bind('<<ComboboxSelected>>', lambda event: self.load_rows())
+        mode.pack(side=LEFT, padx=2, pady=2)
+        # 'FN>0 F1_SCORE<0.5 name_part', see MetricsRows.filter
+        entry = ttk.Entry(frame, textvariable=self.filter_text)
+        entry.bind('<KeyRelease>', lambda event: self.apply_filter())
+        entry.pack(side=LEFT, fill=X, expand=True, padx=2, pady=2)
+
+    def create_table(self):
+        columns = ('name', *METRICS_COLUMNS)
+        tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse', height=1)
+        for column in columns:
+            tree.heading(column, text=column, command=lambda c=column: self.sort(c))
+            tree.column(column, width=160 if column == 'name' else 60, anchor=W if column == 'name' else E,
+                        stretch=column == 'name')
+        tree.grid(row=1, column=0, sticky=NSEW)
+        scrollbar = ttk.Scrollbar(self, orient=VERTICAL, command=self.yview)
+        scrollbar.grid(row=1, column=1, sticky=NS)
+
+        tree.bind('<Configure>', self.resize_rows)
+        tree.bind('<<TreeviewSelect>>', self.select_row)
+        tree.bind('<Double-Button-1>', self.update_path)
+        tree.bind('<MouseWheel>', self.wheel)
+        tree.bind('<Button-4>', lambda event: self.yview('scroll', -TABLE_WHEEL_ROWS, 'units'))
+        tree.bind('<Button-5>', lambda event: self.yview('scroll', TABLE_WHEEL_ROWS, 'units'))
+        return tree, scrollbar
+
+    def load_rows(self):
+        """(re)build the metrics of the mode rows from the loader, keeping the sort, the filter and the scroll"""
+        parent = self.viewer.modules_parent
+        selected = self.selected_location()
+        self.rows = MetricsRows.frames(parent) if self.mode.get() == 'frames' else MetricsRows.scenes(parent)
+        self.update_rows(selected)
+
+    def update_scenes(self, indexes: list[int]):
+        """lazy mode: only the rows of the scenes {indexes} built since the previous poll are updated"""
+        parent = self.viewer.modules_parent
+        selected = self.selected_location()
+        for index in indexes:
+            self.rows.update_scene(index, parent.children[index])
+        self.update_rows(selected)
+
+    def update_rows(self, selected: tuple[int, int] | None):
+        """sort and filter the changed rows again, keep the offset and the selection of the row at {selected}"""
+        if self.sort_by:
+            self.rows.sort(*self.sort_by)
+        self.rows.filter(self.filter_text.get())
+        self.selected = None if selected is None else self.rows.position(selected)
+        self.offset = min(self.offset, max(len(self.rows.view) - len(self.items), 0))
+        self.refresh()
+
+    def selected_location(self) -> tuple[int, int] | None:
+        return None if self.selected is None else self.rows.location(self.selected)
+
+    def apply_filter(self):
+        self.rows.filter(self.filter_text.get())
+        self.offset, self.selected = 0, None
+        self.refresh()
+
+    def sort(self, column: str):
+        """sort by {column}, a second click on the same column reverses the order"""
+        descending = self.sort_by == (column, False)
+        self.sort_by = (column, descending)
+        self.rows.sort(column, descending)
+        for name in ('name', *METRICS_COLUMNS):
+            arrow = (' \u25bc' if descending else ' \u25b2') if name == column else ''
+            self.tree.heading(name, text=name + arrow)
+        self.offset, self.selected = 0, None
+        self.refresh()
+
+    def resize_rows(self, event=None):
+        """keep one Treeview item per visible row"""
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or TABLE_ROW_HEIGHT)
+        count = max((self.tree.winfo_height() - TABLE_HEADER_HEIGHT) // row_height, 1)
+        while len(self.items) < count:
+            self.items.append(self.tree.insert('', END, values=()))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        self.refresh()
+
+    def wheel(self, event):
+        # windows sends +-120 per wheel step, macos small deltas, any delta scrolls at least one step
+        steps = -int(math.copysign(max(1, abs(event.delta) // 120), event.delta))
+        self.yview('scroll', steps * TABLE_WHEEL_ROWS, 'units')
+
+    def yview(self, *args):
+        """the scrollbar / mouse wheel scroll moves the visible window over the view"""
+        total, visible = len(self.rows.view), len(self.items)
+        if args[0] == 'moveto':
+            offset = int(float(args[1]) * total)
+        else:
+            offset = self.offset + int(args[1]) * (visible if args[2] == 'pages' else 1)
+        self.offset = min(max(offset, 0), max(total - visible, 0))
+        self.refresh()
+
+    def refresh(self):
+        """write the values of the visible rows into the Treeview items"""
+        total = len(self.rows.view)
+        self.tree.selection_remove(*self.tree.selection())
+        for i, item in enumerate(self.items):
+            position = self.offset + i
+            self.tree.item(item, values=self.rows.row(position) if position < total else ())
+            if position == self.selected:
+                self.tree.selection_set(item)
+        if total:
+            self.scrollbar.set(self.offset / total, min(self.offset + len(self.items), total) / total)
+        else:
+            self.scrollbar.set(0, 1)
 
-        self.path_listbox.bind("<Double-Button-1>", self.update_path)
-
-    def create_listbox(self):
-        lb = Listbox(self, selectmode=SINGLE, height=15)
-        [lb.insert(END, item) for item in self.viewer.modules_parent.children_list]
-        lb.grid(row=0, column=0, sticky=NSEW)
-        # Create a vertical Scrollbar
-        scrollbar = Scrollbar(lb, orient="vertical")
-        scrollbar.pack(side=RIGHT, fill=Y)
-        # Connect the Scrollbar to the Listbox
-        lb.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=lb.yview)
-        return lb
+    def select_row(self, event=None):
+        if (selection := self.tree.selection()) and selection[0] in self.items:
+            position = self.offset + self.items.index(selection[0])
+            self.selected = position if position < len(self.rows.view) else None
 
     def update_path(self, event=None):
-        # Get the selected path from the Listbox
-        selected_index = self.path_listbox.curselection()
-        if selected_index:
-            self.viewer.update_module_parent(selected_index[0])
-            selected_parent = self.path_listbox.get(selected_index)
-            print(f"Selected path: {selected_parent}")
+        # display the selected scene or frame
+        if self.selected is not None:
+            scene_index, frame_index = self.rows.location(self.selected)
+            if frame_index < 0:
+                self.viewer.update_module_parent(scene_index)
+            else:
+                self.viewer.show_frame(scene_index, frame_index)
+            print(f"Selected path: {self.rows.row(self.selected)[0]}")
         else:
             print("No path selected")
 
 
-class Slide(Label):
+class Slide(Canvas):
     def __init__(self, master, viewer: Viewer, images_path, **kwargs):
-        Label.__init__(self, master, **kwargs)
+        Canvas.__init__(self, master, highlightthickness=0, **kwargs)
         self.nav_frame = None
         self.create_navigation_buttons()
         self.prev_btn = None
@@ -330,11 +576,12 @@ class Slide(Label):
         self.images_path = images_path
         self.img_annotations = None
         self.p_img: ImageTk.PhotoImage | None = None
+        self.image_item = None
         self.rect_thick = 2
         self.font_size = 15
         self.configure(bg=viewer.root['bg'])
         self.current_image: OgiImage | OgiImage | None = None
-        self.image: Image | None = None
+        self.image_path: str | None = None
         self.image_width = None
         self.image_height = None
         self.image_x_offset = None
@@ -343,9 +590,11 @@ class Slide(Label):
         self.images_list = None
         self.index = 0
         self.pack(fill='both', expand=True)
-        self.bind("<Configure>", self.set_image)
-        self.gt = False
-        self.predict = False
+        self.renderer = RenderScheduler(self, self.set_image)
+        self.bind("<Configure>", self.renderer.request)
+        # gt / predict boxes visibility
+        self.gt = True
+        self.predict = True
         # self.get_images_parent_dir()
 
         self.bind("<Left>", lambda event: self.set_index(-1))
@@ -364,31 +613,48 @@ class Slide(Label):
         prev.place(relx=0.1, rely=0.9, anchor="sw")  # Bottom-left corner
 
     def search_image_index(self, image_name: str):
-        index = self.viewer.module.get_image_index(image_name)
+        index = self.viewer.frame_index.frame_index(self.viewer.modules_parent.index, image_name)
         print(self.index, index)
+        if index is None:  # not a frame of the scene, or a lazy scene not built yet
+            return
         self.index = index
         self.set_index(0)
 
     def set_index(self, num):
+        if self.viewer.error_filter and num:
+            # the filter mode steps through the error frames of all the scenes only
+            self.viewer.jump_error(num)
+            return
+        if not self.viewer.module.images:
+            return
         self.index = (self.index + num) % len(self.viewer.module.images)
         self.display()
         self.viewer.bottom_frame.update_info()
         self.nav_frame.lift()
 
-    def display(self):
-        def get_image_path():
-            if self.viewer.model == 'ogi':
-                return os.path.join(self.images_path, self.viewer.module.name, 'images', self.current_image.name)
-            return os.path.join(self.images_path, self.current_image.name)
+    def get_image_path(self, module, image) -> str:
+        if self.viewer.model == 'ogi':
+            return os.path.join(self.images_path, module.name, 'images', image.name)
+        return os.path.join(self.images_path, image.name)
 
+    def display(self):
+        if not self.viewer.module.images:
+            # a lazy scene not built yet or without predictions
+            self.current_image = self.image_path = None
+            self.show_image(Image.new('RGB', (100, 100), color='white'))
+            module = self.viewer.module
+            self.viewer.root.title(f"{self.viewer.root.TITLE}\t\t{module.name} | {getattr(module, 'status', '')}")
+            return
         self.current_image = self.viewer.module.images[self.index]
-        img_path = get_image_path()
+        img_path = self.get_image_path(self.viewer.module, self.current_image)
         if os.path.exists(img_path):
-            self.image = Image.open(img_path)
+            self.image_path = img_path
             self.set_image()
+            self.prefetch()
         else:
+            self.image_path = None
             image = Image.new('RGB', (100, 100), color='white')
-            self.config(image=ImageTk.PhotoImage(image))
+            self.show_image(image)
             # self.set_none_image()
         title = f"{self.viewer.root.TITLE}\t\t{self.viewer.module.name} | {self.current_image.name}"
         self.viewer.root.title(title)
@@ -396,29 +662,43 @@ class Slide(Label):
     def get_img_name(self, ):
         return self.current_image.name
 
-    def set_image(self, event=None):
-        if self.image:
-            print(f"{'=' * 100}\nimage name: {self.get_img_name()}\n")
-            img = self.resize_image()
+    def prefetch(self):
+        """decode the next / previous frames and the first frames of the neighbour scenes in the background"""
+        module, parent = self.viewer.module, self.viewer.modules_parent
+        offsets = [offset for k in range(1, PREFETCH_FRAMES + 1) for offset in (k, -k)]
+        paths = [self.get_image_path(module, module.images[(self.index + offset) % len(module.images)])
+                 for offset in offsets]
+        for i in (parent.index + 1, parent.index - 1):
+            if (scene := parent.children[i % len(parent.children)]).images:
+                paths.append(self.get_image_path(scene, scene.images[0]))
+        self.viewer.image_cache.prefetch(list(dict.fromkeys(paths)), self.get_box(), self.scale)
+
+    def set_image(self, event=None, fast=False):
+        """draw the image as the base canvas item and the boxes as the overlay items above it"""
+        if self.image_path:
+            img = self.resize_image(fast)
+            self.show_image(img)
             if self.current_image:
-                # bottom_frame.set_info_frame()
-                img = self.drew_annotations(img)
-            print(f"{'=' * 100}\n")
-            self.p_img = ImageTk.PhotoImage(img)
-            self.config(image=self.p_img)
-
-    def resize_image(self):
-        iw, ih = self.image.width, self.image.height
-        mw, mh = self.master.winfo_width(), self.master.winfo_height()
-        mh = mh - self.viewer.bottom_frame.winfo_reqheight() - 20
-        if iw > ih:
-            ih = ih * (mw / iw)
-            r = mh / ih if (ih / mh) > 1 else 1
-            iw, ih = mw * r, ih * r
+                self.drew_annotations(img.width, img.height)
+
+    def show_image(self, img):
+        self.p_img = ImageTk.PhotoImage(img)
+        x, y = self.winfo_width() / 2, self.winfo_height() / 2
+        if self.image_item is None:
+            self.image_item = self.create_image(x, y, image=self.p_img)
         else:
-            iw = iw * (mh / ih)
-            r = mw / iw if (iw / mw) > 1 else 1
-            iw, ih = iw * r, mh * r
+            self.coords(self.image_item, x, y)
+            self.itemconfigure(self.image_item, image=self.p_img)
+        self.delete(BOX_TAG)
+
+    def get_box(self) -> tuple[int, int]:
+        """the (width, height) available for the image"""
+        mw, mh = self.master.winfo_width(), self.master.winfo_height()
+        return max(mw, 1), max(mh - self.viewer.bottom_frame.winfo_reqheight() - 20, 1)
+
+    def resize_image(self, fast=False):
+        mw, mh = self.get_box()
+        image, (iw, ih) = self.viewer.image_cache.get(self.image_path, (mw, mh), self.scale, fast)
         x_offset = max((mw - iw) // 2, 0)
         y_offset = max((mh - ih) // 2, 0)
 
@@ -428,45 +708,27 @@ class Slide(Label):
         self.image_height = ih
         # print(f"image resize width: {iw}, height: {ih}")
 
-        return self.image.resize((int(iw * self.scale), int(ih * self.scale)))
-
-    def drew_annotations(self, img):
-        gt_bboxes = self.current_image.gt
-        pred_bboxes = self.current_image.pred
-        confidence_list = self.current_image.confidence
-        print(f"{confidence_list=}")
-        def print_iou():
-            for gt_bbox in self.current_image.gt:
-                gt_bbox = OgiImage.bbox2pt(gt_bbox)
-                for pred_bbox in self.current_image.pred:
-                    pred_bbox = OgiImage.bbox2pt(pred_bbox)
-                    iou = self.current_image.calc_iou(gt_bbox, pred_bbox, 0.6)
-                    print(f"{iou=}\n\t{gt_bbox=}\n\t{pred_bbox=}\n")
-
-        # print_iou()
-
-        def drew_bboxes(bboxes, outline):
-            draw = ImageDraw.Draw(img)
-            drew_font = ImageFont.truetype("arial.ttf", int(font_size))
-            for bbox in bboxes:
-                bbox = self.viewer.slide.calc_bbox(bbox, self.image_width, self.image_height)
-                draw.rectangle(bbox, outline=outline, width=int(rect_thick))
-
-        drew_bboxes(gt_bboxes, gt_outline)
-        drew_bboxes(pred_bboxes, pred_outline)
-        return img
+        return image
+
+    def drew_annotations(self, width, height):
+        """one rectangle item per box over the centered {width} x {height} image"""
+        left, top = (self.winfo_width() - width) / 2, (self.winfo_height() - height) / 2
+        for bboxes, tag in ((self.current_image.gt, GT_TYPE), (self.current_image.pred, PREDICT_TYPE)):
+            for bbox in self.calc_bboxes(bboxes, width, height, left, top).tolist():
+                self.create_rectangle(*bbox, tags=(BOX_TAG, tag))
+        self.update_overlay()
+
+    def update_overlay(self):
+        """apply the boxes colors, thickness and visibility to the drawn items, the image is not redrawn"""
+        for tag, outline, visible in ((GT_TYPE, gt_outline, self.gt), (PREDICT_TYPE, pred_outline, self.predict)):
+            self.itemconfigure(tag, outline=outline, width=int(rect_thick), state=NORMAL if visible else HIDDEN)
 
     @staticmethod
-    def calc_bbox(bbox, width, height):
-        # print(f"before calc_bbox: {bbox}")
-        x, y, w, h = bbox
-        left = x * width
-        top = y * height
-        right = left + (w * width)
-        bottom = top + (h * height)
-        # print(f"after calc_bbox: {[left, top, right, bottom]}")
-        return left, top, right, bottom
-        # return x1 * width, y1 * height, w, h
+    def calc_bboxes(bboxes, width, height, left=0, top=0) -> np.ndarray:
+        """(N, 4) normalized [x, y, w, h] bboxes to [left, top, right, bottom] canvas points"""
+        pts = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4) * [width, height, width, height]
+        pts[:, 2:] += pts[:, :2]
+        return pts + [left, top, left, top]
 
     def initiate_slide(self):
         self.display()
@@ -498,6 +760,7 @@ class BottomFrame(ttk.Frame):
         self.img_tp = None
         self.img_fp = None
         self.img_tn = None
+        self.progress = None
 
         self.pack(side='bottom', fill='x')
         self.style = ttk.Style()
@@ -509,6 +772,7 @@ class BottomFrame(ttk.Frame):
         self.create_nav_buttons()
         self.create_general_info_frame()
         self.create_image_info_frame()
+        self.create_progress_label()
         self.update_info()
 
     def create_general_info_frame(self):
@@ -546,6 +810,14 @@ class BottomFrame(ttk.Frame):
         self.img_fp = create_label(MODEL_FP)
         self.img_tn = create_label(MODEL_FN)
 
+    def create_progress_label(self):
+        self.progress = ttk.Label(self, font=font, style='bar.TLabel', text='', padding=(5, 0))
+        self.progress.pack(side='right')
+
+    def update_progress(self, built, total):
+        """lazy mode scenes build progress, hidden once all the scenes are built"""
+        self.progress.config(text=f"scenes: {built}/{total}" if built < total else '')
+
     # def set_info_frame(self):
     #     gt, pred, tp, fp, tn, iou = manager.get_iou_info()
     #     recall, precision, f1= manager.get_iou_analysis()
@@ -586,6 +858,14 @@ class BottomFrame(ttk.Frame):
             side="left")
         ttk.Button(frame, text='next >', style='bar.TButton', command=lambda: self.viewer.slide.set_index(1)).pack(
             side="left")
+        ttk.Button(frame, text='< error', style='bar.TButton', command=lambda: self.viewer.jump_error(-1)).pack(
+            side="left")
+        ttk.Button(frame, text='error >', style='bar.TButton', command=lambda: self.viewer.jump_error(1)).pack(
+            side="left")
+        error_filter = ttk.Combobox(frame, values=[ALL_FRAMES, *ERROR_KINDS], width=5, state='readonly')
+        error_filter.set(ALL_FRAMES)
+        error_filter.bind('<<ComboboxSelected>>', lambda event: self.viewer.set_error_filter(error_filter.get()))
+        error_filter.pack(side="left", padx=(5, 0))
 
     def create_toggle_button(self):
         print(self.winfo_height())
@@ -603,7 +883,13 @@ if __name__ == '__main__':
     ]
     gt = r'C:\Users\MosheMendelovich\Documents\percepto\cocompare\data\ogi\gt'
     pred = r'C:\Users\MosheMendelovich\Documents\percepto\cocompare\data\ogi\predictions_2024-09-04-12-43-48.json'
-    args = {'model': 'ogi', 'gt': gt, 'pred': pred, 'th': 0.001, 'd_th': 0.02}
+    parser = argparse.ArgumentParser(description="Viewer of the gt and predictions boxes")
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help="list the scenes at once and build them in the background (ogi only)"
+    )
+    args = {'model': 'ogi', 'gt': gt, 'pred': pred, 'th': 0.001, 'd_th': 0.02, 'lazy': parser.parse_args().lazy}
     # Wizard()
     Viewer(**args)
     # Initialize root and display widgets